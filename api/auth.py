@@ -1,11 +1,19 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
 from models import User as DBUser
 from datetime import datetime, timedelta
 import jwt
 from typing import Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jwt.exceptions import ExpiredSignatureError
-from fastapi import Cookie, Request, HTTPException
+from fastapi import Cookie, Request, HTTPException, Depends
+from config import HASH_EXECUTOR, HASH_WORKERS, HASH_QUEUE_LIMIT, TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL, TOKEN_REVOCATION_FILE
+from database import get_db
+from cache import TTLCache, FileVersionNotifier
+from validation import Principal
+import time
 
 SECRET_KEY = "rrrr"
 ALGORITHM = "HS256"
@@ -15,9 +23,11 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Create JWT token
-def create_access_token(user_id: int):
-    to_encode = {"user_id": user_id}  # Изменяем поле "sub" на "user_id"
-    expiry = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+def create_access_token(user_id: str, role: str = 'client'):
+    # Роль кладём в подписанный токен, чтобы не ходить за ней в базу на каждый запрос
+    now = datetime.utcnow()
+    to_encode = {"sub": user_id, "role": role, "iat": now}
+    expiry = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expiry})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
@@ -30,9 +40,47 @@ def verify_password(plain_password, hashed_password):
 def hash_password(password: str):
     return pwd_context.hash(password)
 
-def get_user_by_email(db, email: str):
-    user = db.query(DBUser).filter(DBUser.email == email).first()
-    return user
+# Проверка пароля; вторым значением возвращается новый хеш, если параметры CryptContext изменились
+def verify_and_update_password(plain_password, hashed_password):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+# bcrypt занимает 100-300 мс CPU, поэтому выполняется в отдельном пуле, а не в event loop
+if HASH_EXECUTOR == 'process':
+    hash_executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+else:
+    hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='bcrypt')
+
+# Количество задач в пуле (выполняются + ждут очереди)
+hash_in_flight = 0
+
+
+async def run_in_hash_pool(func, *args):
+    global hash_in_flight
+    if hash_in_flight >= HASH_WORKERS + HASH_QUEUE_LIMIT:
+        # Очередь переполнена: лучше быстро отказать, чем держать остальные маршруты
+        raise HTTPException(status_code=503, detail="Сервер перегружен, попробуйте позже", headers={"Retry-After": "1"})
+    hash_in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(hash_executor, func, *args)
+    finally:
+        hash_in_flight -= 1
+
+
+async def hash_password_async(password: str):
+    return await run_in_hash_pool(hash_password, password)
+
+
+async def verify_and_update_password_async(plain_password, hashed_password):
+    return await run_in_hash_pool(verify_and_update_password, plain_password, hashed_password)
+
+def user_by_email_query(email: str):
+    return select(DBUser).filter(DBUser.email == email)
+
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(user_by_email_query(email))
+    return result.scalars().first()
 
 
 def get_email_from_access_token(access_token: str) -> str:
@@ -50,8 +98,7 @@ def get_email_from_access_token(access_token: str) -> str:
 def get_user_id_from_access_token(access_token: str) -> str:
     try:
         decoded_token = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = decoded_token.get("user_id", {}).get("sub")  # Получаем айди пользователя из токена
-        print(user_id)
+        user_id = decoded_token.get("sub")  # Получаем айди пользователя из токена
         return user_id
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
@@ -59,10 +106,91 @@ def get_user_id_from_access_token(access_token: str) -> str:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
     
 
-def get_user_role_by_id(db: Session, user_id: str) -> Optional[str]:
-    db_user = db.query(DBUser).filter(DBUser.id == user_id).first()
-    
-    if db_user:
-        return db_user.role
-    
-    return None
+async def get_user_role_by_id(db: AsyncSession, user_id: str) -> Optional[str]:
+    result = await db.execute(select(DBUser.role).filter(DBUser.id == user_id))
+    return result.scalar()
+
+
+# Кеш уже проверенных токенов: токен -> Principal
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
+# Время последней смены роли пользователя; токены, выданные раньше, перепроверяются по базе.
+# Записи живут не дольше самого токена, после этого старые токены уже просрочены
+role_changes = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+# Смена роли или удаление пользователя в одном воркере должны дойти до остальных. Через общий файл
+# передаётся момент последнего отзыва: увидев новое значение, воркер сбрасывает кеш токенов, а токены,
+# выданные раньше этого момента, перепроверяет по базе. Без файла отзыв действует только в своём процессе
+revocations = FileVersionNotifier(TOKEN_REVOCATION_FILE) if TOKEN_REVOCATION_FILE else None
+revoked_before = 0.0
+_seen_revocation = None
+
+
+def sync_revocations():
+    global revoked_before, _seen_revocation
+    if revocations is None:
+        return
+    value = revocations.read()
+    if value is not None and value != _seen_revocation:
+        _seen_revocation = value
+        revoked_before = float(value)
+        token_cache.clear()
+
+
+def invalidate_user_tokens(user_id: str):
+    now = time.time()
+    role_changes.set(user_id, now)
+    token_cache.remove_where(lambda principal: principal.id == user_id)
+    if revocations is not None:
+        revocations.publish(repr(now))
+
+
+async def get_current_user(access_token: str = Cookie(None), db: AsyncSession = Depends(get_db)) -> Principal:
+    if not access_token:
+        raise HTTPException(status_code=401, detail="Требуется авторизация")
+
+    sync_revocations()
+    principal = token_cache.get(access_token)
+    if principal is not None:
+        return principal
+
+    try:
+        decoded_token = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token has expired")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Неверный токен")
+
+    user_id = decoded_token.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Неверный токен")
+
+    role = decoded_token.get("role")
+    changed_at = max(role_changes.get(user_id, 0), revoked_before)
+    if role is None or (changed_at and decoded_token.get("iat", 0) <= changed_at):
+        role = await get_user_role_by_id(db, user_id)
+        if role is None:
+            raise HTTPException(status_code=401, detail="Неверный токен")
+
+    principal = Principal(id=user_id, role=role)
+    token_cache.set(access_token, principal, ttl=decoded_token["exp"] - time.time())
+    return principal
+
+
+async def get_optional_user(access_token: str = Cookie(None), db: AsyncSession = Depends(get_db)) -> Optional[Principal]:
+    # Для публичных страниц: просроченный или битый токен - это просто гость, а не ошибка 401
+    if not access_token:
+        return None
+    try:
+        return await get_current_user(access_token, db)
+    except HTTPException:
+        return None
+
+
+def require_role(role: str):
+    async def dependency(principal: Principal = Depends(get_current_user)) -> Principal:
+        if principal.role != role:
+            raise HTTPException(status_code=403, detail="You are not authorized to access this page")
+        return principal
+    return dependency
@@ -0,0 +1,64 @@
+"""Задержка event loop во время хеширования паролей: bcrypt в самом loop и в пуле.
+
+    python bench_hashing.py [--concurrency 16] [--interval 5]
+
+Пока идут concurrency одновременных хеширований, проба каждые interval мс засыпает на
+asyncio.sleep и замеряет, насколько позже она проснулась. Это и есть задержка, которую в
+это время получают все остальные запросы воркера (например, страницы каталога).
+Пул берётся тот же, что у приложения (HASH_EXECUTOR, HASH_WORKERS, HASH_QUEUE_LIMIT);
+задачи сверх очереди получают 503 и считаются отдельно.
+"""
+from fastapi import HTTPException
+from auth import hash_password, hash_password_async
+from config import HASH_EXECUTOR, HASH_WORKERS
+import argparse
+import asyncio
+import statistics
+import time
+
+
+async def probe(interval: float, lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def hash_inline(password: str):
+    # Так было до пула: обработчик async, но bcrypt выполняется прямо в event loop
+    return hash_password(password)
+
+
+async def measure(name: str, hash_func, concurrency: int, interval: float):
+    lags, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(interval, lags, stop))
+    await asyncio.sleep(interval * 2)  # проба успевает начать
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(hash_func(f"password{number}") for number in range(concurrency)),
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+
+    rejected = sum(isinstance(result, HTTPException) for result in results)
+    lags_ms = sorted(lag * 1000 for lag in lags)
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(f"{name:<28} задержка loop: медиана {statistics.median(lags_ms):7.1f} мс, p99 {p99:7.1f} мс, "
+          f"макс {lags_ms[-1]:7.1f} мс; {concurrency - rejected} хешей за {elapsed:.2f} с, 503: {rejected}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--interval', type=float, default=5, help="период пробы, мс")
+    args = parser.parse_args()
+    interval = args.interval / 1000
+
+    await hash_password_async("warmup")  # запуск потоков или процессов пула не входит в замер
+    await measure('в event loop', hash_inline, args.concurrency, interval)
+    await measure(f'пул {HASH_EXECUTOR} x{HASH_WORKERS}', hash_password_async, args.concurrency, interval)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
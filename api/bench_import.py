@@ -0,0 +1,89 @@
+"""Загрузка каталога: POST /items/import (CSV, пачками) против POST /items/ по одному товару.
+
+    python bench_import.py [--database-url postgresql+psycopg2://...] [--rows 50000] [--single 1000]
+
+Запросы идут в настоящее ASGI-приложение в том же процессе, без сети (как в benchmark.py):
+сначала один файл из --rows строк через импорт от имени администратора, затем --single
+товаров отдельными POST /items/ подряд. Печатается скорость в строках в секунду. Картинки
+товаров не существуют, поэтому уменьшенные копии не строятся и в замер не попадают.
+Таблицы базы пересоздаются, поэтому указывайте отдельную базу (или --reset).
+"""
+from benchmark import configure_database, reset_database
+import argparse
+import asyncio
+import csv
+import io
+import time
+
+ITEM_KEYS = ['title', 'pol', 'types', 'description', 'price', 'size', 'color', 'image_url', 'quantity']
+
+
+def make_item(number: int) -> dict:
+    return {"title": f"товар {number}", "pol": 'WM'[number % 2], "types": 'платье', "description": f"Описание товара {number}",
+            "price": 500 + number % 19500, "size": 'M', "color": 'синий', "image_url": f"/static/import{number}.webp",
+            "quantity": 100}
+
+
+def make_csv(rows: int) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=ITEM_KEYS)
+    writer.writeheader()
+    writer.writerows(make_item(number) for number in range(rows))
+    return buffer.getvalue().encode()
+
+
+def prepare(reset: bool) -> dict:
+    from sqlalchemy import insert
+    from database import engine, uuid7
+    from models import User as DBUser
+    import auth
+
+    reset_database(reset)
+
+    admin_id = str(uuid7())
+    with engine.begin() as conn:
+        conn.execute(insert(DBUser), [{"id": admin_id, "username": 'admin', "email": 'admin@bench.local',
+                                       "password": auth.hash_password('benchpass1'), "role": 'admin'}])
+    return {"Cookie": f"access_token={auth.create_access_token(admin_id, 'admin')}"}
+
+
+async def run(args, headers: dict):
+    import httpx
+    from main import app
+
+    data = make_csv(args.rows)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        started = time.perf_counter()
+        response = await client.post("/items/import", params={"format": 'csv'}, headers=headers,
+                                      files={"file": ('items.csv', data, 'text/csv')})
+        elapsed = time.perf_counter() - started
+        response.raise_for_status()
+        report = response.json()
+        imported_rate = report["imported"] / elapsed
+        print(f"импорт CSV    {report['imported']:7d} строк за {elapsed:7.2f} с   {imported_rate:10.0f} строк/с"
+              f"   (ошибок: {report['failed']})")
+
+        started = time.perf_counter()
+        for number in range(args.rows, args.rows + args.single):
+            (await client.post("/items/", json=make_item(number))).raise_for_status()
+        elapsed = time.perf_counter() - started
+        single_rate = args.single / elapsed
+        print(f"POST /items/  {args.single:7d} строк за {elapsed:7.2f} с   {single_rate:10.0f} строк/с")
+        print(f"импорт быстрее в {imported_rate / single_rate:.1f} раза")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', help="синхронный URL базы (по умолчанию временный SQLite)")
+    parser.add_argument('--async-database-url', help="асинхронный URL (по умолчанию выводится из --database-url)")
+    parser.add_argument('--reset', action='store_true', help="пересоздать таблицы, даже если база не пустая")
+    parser.add_argument('--rows', type=int, default=50000, help="строк в файле импорта")
+    parser.add_argument('--single', type=int, default=1000, help="товаров, создаваемых по одному")
+    args = parser.parse_args()
+
+    configure_database(args.database_url, args.async_database_url)
+    asyncio.run(run(args, prepare(args.reset)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Во что обходятся метрики: MetricsMiddleware и счётчики SQL (обработчики событий SQLAlchemy).
+
+    python bench_metrics.py [--database-url postgresql+psycopg2://...] [--requests 2000] [--queries 3]
+
+Одно и то же маленькое приложение FastAPI - маршрут выполняет --queries запросов SELECT 1 через
+AsyncSession к указанной базе - собирается в трёх вариантах: без метрик, с MetricsMiddleware и
+с middleware плюс instrument_engine (как в main.py). У каждого варианта свой движок, чтобы
+обработчики событий одного не влияли на другие. Запросы идут последовательно через ASGI без
+сети, варианты чередуются по раундам; печатается медиана и p99 одного запроса и разница с
+вариантом без метрик - это и есть накладные расходы на запрос.
+"""
+from benchmark import configure_database, percentile
+import argparse
+import asyncio
+import time
+
+VARIANTS = ['без метрик', 'middleware', 'middleware + SQL']
+
+
+def build_app(variant: str, url: str, queries: int):
+    from fastapi import FastAPI, Depends
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from database import _pool_options
+    from metrics import Metrics, MetricsMiddleware
+
+    engine = create_async_engine(url, **_pool_options(url))
+    session_factory = sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+    async def get_db():
+        async with session_factory() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def read(item_id: int, db: AsyncSession = Depends(get_db)):
+        for _ in range(queries):
+            await db.execute(text("SELECT 1"))
+        return {"id": item_id}
+
+    if variant != 'без метрик':
+        metrics = Metrics()
+        app.add_middleware(MetricsMiddleware, metrics=metrics)
+        if variant == 'middleware + SQL':
+            metrics.instrument_engine(engine.sync_engine)
+    return app, engine
+
+
+async def run(args, url: str):
+    import httpx
+
+    apps = {variant: build_app(variant, url, args.queries) for variant in VARIANTS}
+    durations = {variant: [] for variant in VARIANTS}
+    clients = {variant: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+               for variant, (app, engine) in apps.items()}
+    try:
+        for variant, client in clients.items():  # прогрев: соединения пула и разбор маршрутов
+            for number in range(50):
+                (await client.get(f"/items/{number}")).raise_for_status()
+
+        per_round = max(1, args.requests // args.rounds)
+        for _ in range(args.rounds):
+            for variant, client in clients.items():
+                for number in range(per_round):
+                    started = time.perf_counter()
+                    (await client.get(f"/items/{number}")).raise_for_status()
+                    durations[variant].append((time.perf_counter() - started) * 1_000_000)
+    finally:
+        for variant, client in clients.items():
+            await client.aclose()
+            await apps[variant][1].dispose()
+
+    baseline = percentile(sorted(durations[VARIANTS[0]]), 50)
+    for variant in VARIANTS:
+        values = sorted(durations[variant])
+        median = percentile(values, 50)
+        print(f"{variant:<18} медиана {median:8.0f} мкс   p99 {percentile(values, 99):8.0f} мкс   "
+              f"накладные расходы {median - baseline:+6.0f} мкс")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', help="синхронный URL базы (по умолчанию временный SQLite)")
+    parser.add_argument('--async-database-url', help="асинхронный URL (по умолчанию выводится из --database-url)")
+    parser.add_argument('--requests', type=int, default=2000, help="запросов на вариант")
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=3, help="SQL-запросов на один HTTP-запрос")
+    args = parser.parse_args()
+
+    configure_database(args.database_url, args.async_database_url)
+    from config import ASYNC_URL_DATABASE
+    asyncio.run(run(args, ASYNC_URL_DATABASE))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Глубокие страницы каталога: курсор (keyset) против skip (OFFSET) на первой и на далёкой странице.
+
+    python bench_pagination.py [--database-url postgresql+psycopg2://...] [--items 1000000] [--page 10000]
+
+Заполняет базу товарами до --items штук (уже имеющиеся товары не пересоздаются, поэтому
+повторный прогон на той же базе начинается сразу) и замеряет запрос страницы так, как его
+выполняет GET /items/: для курсора - keyset_page, для skip - тот же запрос с OFFSET. Курсор
+далёкой страницы находится заранее и в замер не входит. Кеш каталога не участвует.
+По умолчанию база - временный SQLite; для цифр, близких к боевым, укажите PostgreSQL.
+"""
+from benchmark import configure_database, percentile
+import argparse
+import asyncio
+import time
+
+SEARCH_WORDS = ['платье', 'куртка', 'рубашка', 'брюки', 'обувь', 'шорты']
+SIZES = ['S', 'M', 'L', 'XL']
+COLORS = ['красный', 'синий', 'чёрный']
+
+
+def seed(total: int, batch: int = 10000) -> int:
+    from sqlalchemy import func, insert, select
+    from database import engine, Base, uuid7
+    from models import Item as DBItem
+
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(DBItem)).scalar()
+    for start in range(existing, total, batch):
+        with engine.begin() as conn:
+            conn.execute(insert(DBItem), [
+                {"id": str(uuid7()), "title": f"{SEARCH_WORDS[i % len(SEARCH_WORDS)]} {i}", "pol": 'WM'[i % 2],
+                 "types": SEARCH_WORDS[i % len(SEARCH_WORDS)], "description": f"Описание товара {i}",
+                 "price": 500 + i * 7919 % 19500, "size": SIZES[i // 3 % len(SIZES)], "color": COLORS[i // 7 % len(COLORS)],
+                 "image_url": f"/static/bench{i}.webp", "quantity": 100}
+                for i in range(start, min(total, start + batch))
+            ])
+    return max(existing, total)
+
+
+def page_cursor(sort: str, skip: int) -> str:
+    # Курсор "вперёд" ссылается на последнюю строку предыдущей страницы
+    from sqlalchemy import select
+    from database import engine
+    from main import ITEM_SORT_KEYS
+    from pagination import encode_cursor
+
+    keys = ITEM_SORT_KEYS[sort]
+    with engine.connect() as conn:
+        row = conn.execute(select(*keys).order_by(*keys).offset(skip - 1).limit(1)).one()
+    return encode_cursor([str(value) if not isinstance(value, int) else value for value in row])
+
+
+async def timed(repeat: int, func) -> list:
+    await func()  # прогрев: план запроса и страницы данных в кеше базы
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        durations.append((time.perf_counter() - started) * 1000)
+    return durations
+
+
+async def run(args):
+    from database import AsyncSessionLocal
+    from main import ITEM_OUT_FIELDS, ITEM_SORT_KEYS, catalog_query
+    from pagination import keyset_page
+
+    skip = (args.page - 1) * args.limit
+    async with AsyncSessionLocal() as db:
+        for sort in ITEM_SORT_KEYS:
+            query = catalog_query(ITEM_OUT_FIELDS, sort)
+            cursor = page_cursor(sort, skip)
+
+            async def by_cursor(cursor):
+                await keyset_page(db, query, ITEM_SORT_KEYS[sort], cursor, args.limit, scalars=False)
+
+            async def by_offset(skip):
+                (await db.execute(query.order_by(*ITEM_SORT_KEYS[sort]).offset(skip).limit(args.limit))).all()
+
+            for name, func in [("курсор, стр. 1", lambda: by_cursor(None)),
+                               (f"курсор, стр. {args.page}", lambda: by_cursor(cursor)),
+                               ("skip, стр. 1", lambda: by_offset(0)),
+                               (f"skip, стр. {args.page}", lambda: by_offset(skip))]:
+                durations = sorted(await timed(args.repeat, func))
+                print(f"sort={sort:<6} {name:<20} p50 {percentile(durations, 50):8.2f} мс   "
+                      f"p95 {percentile(durations, 95):8.2f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', help="синхронный URL базы (по умолчанию временный SQLite)")
+    parser.add_argument('--async-database-url', help="асинхронный URL (по умолчанию выводится из --database-url)")
+    parser.add_argument('--items', type=int, default=1_000_000)
+    parser.add_argument('--page', type=int, default=10000)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    if args.page < 2 or (args.page - 1) * args.limit >= args.items:
+        parser.error("страница должна быть дальше первой и в пределах --items")
+
+    configure_database(args.database_url, args.async_database_url)
+    started = time.perf_counter()
+    total = seed(args.items)
+    print(f"товаров в базе: {total} (заполнение {time.perf_counter() - started:.1f} с)")
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Поиск по каталогу: p50/p95 GET /items/search на большом каталоге без кеша и с кешем фасетов.
+
+    python bench_search.py [--database-url postgresql+psycopg2://...] [--items 1000000] [--target-ms 20]
+
+Заполняет базу так же, как bench_pagination.py (уже имеющиеся товары не пересоздаются), и
+гоняет запросы поиска через настоящее ASGI-приложение без сети. "Холодный" запрос - кеш
+каталога сброшен, считаются и страница, и фасеты; "следующая страница" - тот же поиск с
+курсором, итог и фасеты уже в кеше. Код выхода 1 - p95 холодного запроса хотя бы одного
+сценария выше --target-ms. Цель задана для PostgreSQL; на SQLite цифры только ориентир.
+"""
+from benchmark import configure_database, percentile
+from bench_pagination import seed
+import argparse
+import asyncio
+import sys
+import time
+
+SCENARIOS = {
+    'слово': {"q": 'куртка'},
+    'слово + фасет': {"q": 'платье', "color": ['красный']},
+    'два фасета (мультивыбор)': {"size": ['S', 'M'], "color": ['синий', 'чёрный']},
+    'диапазон цены': {"price_min": 1000, "price_max": 2000},
+}
+
+
+async def timed(client, params: dict, repeat: int, before=None) -> list:
+    durations = []
+    for _ in range(repeat + 1):  # первый запрос - прогрев
+        if before:
+            before()
+        started = time.perf_counter()
+        response = await client.get("/items/search", params=params)
+        durations.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return sorted(durations[1:])
+
+
+async def run(args) -> list:
+    import httpx
+    from main import app, catalog_cache
+
+    slow = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name, params in SCENARIOS.items():
+            params = {**params, "limit": args.limit}
+            cold = await timed(client, params, args.repeat, before=catalog_cache.bump)
+            first = (await client.get("/items/search", params=params)).json()
+            # Страницы из кеша убираем, итог и фасеты ('search-counts') остаются
+            next_page = (await timed(client, {**params, "cursor": first["next_cursor"]}, args.repeat,
+                                     before=lambda: catalog_cache.discard(lambda key: key[0] == 'search'))
+                         if first["next_cursor"] else [])
+            print(f"{name:<26} найдено {first['total']:8d}   холодный p50 {percentile(cold, 50):7.1f} мс  "
+                  f"p95 {percentile(cold, 95):7.1f} мс" +
+                  (f"   след. страница p95 {percentile(next_page, 95):7.1f} мс" if next_page else ''))
+            if percentile(cold, 95) > args.target_ms:
+                slow.append(name)
+    return slow
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url', help="синхронный URL базы (по умолчанию временный SQLite)")
+    parser.add_argument('--async-database-url', help="асинхронный URL (по умолчанию выводится из --database-url)")
+    parser.add_argument('--items', type=int, default=1_000_000)
+    parser.add_argument('--limit', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--target-ms', type=float, default=20, help="допустимый p95 холодного запроса")
+    args = parser.parse_args()
+
+    configure_database(args.database_url, args.async_database_url)
+    started = time.perf_counter()
+    total = seed(args.items)
+    print(f"товаров в базе: {total} (заполнение {time.perf_counter() - started:.1f} с)")
+    slow = asyncio.run(run(args))
+    if slow:
+        print(f"p95 выше {args.target_ms:g} мс: {', '.join(slow)}")
+    return 1 if slow else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Сколько стоит отдать 1000 товаров из GET /items/: прежний путь и текущий.
+
+    python bench_serialization.py [--items 1000] [--repeat 20]
+
+Прежний путь: ORM-объекты -> словари -> проверка через response_model -> jsonable_encoder -> json.
+Текущий: кортежи нужных колонок -> словари -> orjson. Для сравнения замеряется и выборка
+только id,title,price,image_url. База - SQLite в памяти, поэтому цифры показывают
+стоимость самого приложения, а не сети и диска.
+"""
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import Item as DBItem
+from validation import ItemOut
+from main import ITEM_OUT_FIELDS, item_columns, item_row_to_dict, item_to_dict
+import argparse
+import json
+import orjson
+import time
+
+
+def before(session) -> bytes:
+    items = session.execute(select(DBItem).order_by(DBItem.id)).scalars().all()
+    validated = [ItemOut(**item_to_dict(item)) for item in items]
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def after(session, fields: tuple) -> bytes:
+    rows = session.execute(select(*item_columns(fields, [DBItem.id])).order_by(DBItem.id)).all()
+    return orjson.dumps([item_row_to_dict(row._mapping, fields) for row in rows])
+
+
+def measure(name: str, repeat: int, items: int, run):
+    run()  # прогрев
+    started = time.perf_counter()
+    for _ in range(repeat):
+        size = len(run())
+    per_run = (time.perf_counter() - started) / repeat
+    print(f"{name:<50} {per_run * 1000 / items * 1000:8.2f} мс на 1000 товаров  ({size} байт)")
+    return per_run
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(DBItem(title=f"Товар {i}", pol='WM'[i % 2], types='платье', description='Описание товара ' * 5,
+                           price=1000 + i, size='SML'[i % 3], color='красный', image_url=f"/static/item{i}.webp",
+                           quantity=10) for i in range(args.items))
+    session.commit()
+
+    # Каждый прогон читает строки заново, как запрос без кеша
+    baseline = measure('ORM + response_model + json', args.repeat, args.items,
+                       lambda: (session.expunge_all(), before(session))[1])
+    full = measure('строки + orjson', args.repeat, args.items, lambda: after(session, ITEM_OUT_FIELDS))
+    short = measure('строки + orjson, fields=id,title,price,image_url', args.repeat, args.items,
+                    lambda: after(session, ('id', 'title', 'price', 'image_url')))
+    print(f"ускорение: {baseline / full:.1f}x, с fields=: {baseline / short:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Ключи товаров и пользователей: текстовые uuid4 (как было) против нативных uuid7.
+
+    python bench_uuid_keys.py [--url postgresql+psycopg2://...] [--rows 200000] [--batch 1000]
+
+В указанной базе (по умолчанию URL_DATABASE) создаются две временные таблицы, устроенные как
+sales: первичный ключ и индекс по ссылке на товар. В обе вставляется одинаковое число строк
+пачками (каждая пачка - своя транзакция, как заказы в приложении), затем печатаются скорость
+вставки и размер индексов. Таблицы удаляются в конце. Размер индексов считается на PostgreSQL
+(pg_relation_size) и на SQLite, собранном с dbstat. Сравнение имеет смысл на PostgreSQL: в SQLite
+GUID хранится текстом, и меняется только порядок вставки. На маленьких объёмах разница не видна -
+случайные ключи начинают мешать, когда индекс перестаёт помещаться в shared_buffers.
+"""
+from sqlalchemy.exc import OperationalError
+from sqlalchemy import create_engine, text, Table, Column, MetaData, String, Integer, Index
+from config import URL_DATABASE
+from database import GUID, uuid7
+import argparse
+import time
+import uuid
+
+metadata = MetaData()
+
+VARIANTS = {
+    'uuid4 в тексте': (
+        Table('bench_keys_text', metadata,
+              Column('id', String(36), primary_key=True), Column('item_id', String(36)), Column('quantity', Integer),
+              Index('ix_bench_keys_text_item_id', 'item_id')),
+        lambda: str(uuid.uuid4()),
+    ),
+    'uuid7 нативный': (
+        Table('bench_keys_uuid', metadata,
+              Column('id', GUID, primary_key=True), Column('item_id', GUID), Column('quantity', Integer),
+              Index('ix_bench_keys_uuid_item_id', 'item_id')),
+        uuid7,
+    ),
+}
+
+
+def index_sizes(conn, table: Table) -> dict:
+    names = [f"{table.name}_pkey", *(index.name for index in table.indexes)]
+    if conn.dialect.name == 'postgresql':
+        return {name: conn.execute(text("SELECT pg_relation_size(CAST(:name AS regclass))"), {"name": name}).scalar()
+                for name in names}
+    if conn.dialect.name == 'sqlite':
+        # У SQLite первичный ключ не-integer - автоматический индекс sqlite_autoindex_<таблица>_1
+        names[0] = f"sqlite_autoindex_{table.name}_1"
+        try:
+            return {name: conn.execute(text("SELECT sum(pgsize) FROM dbstat WHERE name = :name"), {"name": name}).scalar()
+                    for name in names}
+        except OperationalError:  # SQLite без dbstat
+            return {}
+    return {}
+
+
+def run(engine, table: Table, new_id, rows: int, batch: int) -> tuple[float, dict]:
+    # Товаров меньше, чем строк: ссылки повторяются, как в продажах
+    item_ids = [new_id() for _ in range(max(1, rows // 50))]
+    started = time.perf_counter()
+    for start in range(0, rows, batch):
+        with engine.begin() as conn:
+            conn.execute(table.insert(), [
+                {"id": new_id(), "item_id": item_ids[number % len(item_ids)], "quantity": 1}
+                for number in range(start, min(rows, start + batch))
+            ])
+    elapsed = time.perf_counter() - started
+    with engine.connect() as conn:
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text(f"ANALYZE {table.name}"))
+        return rows / elapsed, index_sizes(conn, table)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default=URL_DATABASE)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    try:
+        for name, (table, new_id) in VARIANTS.items():
+            rate, sizes = run(engine, table, new_id, args.rows, args.batch)
+            size = ', '.join(f"{index} {value / 1024 / 1024:.1f} МБ" for index, value in sizes.items() if value) or 'размер н/д'
+            print(f"{name:<16} {rate:10.0f} строк/с   {size}")
+    finally:
+        metadata.drop_all(engine)
+
+
+if __name__ == '__main__':
+    main()
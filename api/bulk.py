@@ -0,0 +1,121 @@
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import Callable, Optional
+from database import dialect_insert, uuid7
+from models import Item as DBItem
+from validation import ItemCreate
+from config import IMPORT_BATCH_SIZE, IMPORT_MAX_ERRORS, EXPORT_BATCH_SIZE
+import csv
+import io
+import json
+import uuid
+
+ITEM_COLUMNS = [column.key for column in DBItem.__table__.columns]
+
+
+def detect_format(filename: Optional[str], fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+def iter_records(binary_file, fmt: str):
+    # Файл читается построчно, целиком в память не загружается
+    text_file = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for number, record in enumerate(csv.DictReader(text_file), start=1):
+            yield number, record
+    else:
+        for number, line in enumerate(text_file, start=1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError as e:
+                    yield number, e
+
+
+def validate_record(record) -> dict:
+    if isinstance(record, Exception):
+        raise ValueError(f"Некорректный JSON: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("Строка должна быть объектом")
+    item = ItemCreate(**record)
+    row = item.dict()
+    # Невалидный id - ошибка строки (ValueError), а не всего импорта
+    row["id"] = str(uuid.UUID(str(record["id"]))) if record.get("id") else str(uuid7())
+    return row
+
+
+async def upsert_items(db: AsyncSession, rows: list):
+    # Один executemany на пачку; существующие товары (по id) обновляются
+    stmt = dialect_insert(db, DBItem.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DBItem.id],
+        set_={key: stmt.excluded[key] for key in ITEM_COLUMNS if key != 'id'},
+    )
+    await db.execute(stmt, rows)
+    await db.commit()
+
+
+async def import_items(db: AsyncSession, binary_file, fmt: str, on_batch: Optional[Callable[[list], None]] = None) -> dict:
+    records = iter_records(binary_file, fmt)
+    processed = imported = failed = 0
+    errors = []
+
+    def next_batch():
+        # Чтение и валидация пачки выполняются в пуле потоков, чтобы не блокировать event loop
+        nonlocal processed, failed
+        batch = []
+        for number, record in records:
+            processed += 1
+            try:
+                batch.append(validate_record(record))
+            except (ValidationError, ValueError, TypeError) as e:
+                failed += 1
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append({"row": number, "error": str(e)})
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                break
+        return batch
+
+    while True:
+        batch = await run_in_threadpool(next_batch)
+        if not batch:
+            break
+        await upsert_items(db, batch)
+        imported += len(batch)
+        if on_batch is not None:
+            on_batch(batch)
+
+    return {"processed": processed, "imported": imported, "failed": failed, "errors": errors}
+
+
+async def export_items(db: AsyncSession, fmt: str):
+    # Выгрузка пачками по id (keyset), чтобы не держать всю таблицу в памяти
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=ITEM_COLUMNS)
+        writer.writeheader()
+        yield buffer.getvalue()
+
+    last_id = None
+    while True:
+        query = select(*[getattr(DBItem, key) for key in ITEM_COLUMNS]).order_by(DBItem.id).limit(EXPORT_BATCH_SIZE)
+        if last_id is not None:
+            query = query.where(DBItem.id > last_id)
+        rows = (await db.execute(query)).mappings().all()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=ITEM_COLUMNS)
+            writer.writerows(rows)
+            yield buffer.getvalue()
+        else:
+            yield ''.join(json.dumps(dict(row), ensure_ascii=False) + '\n' for row in rows)
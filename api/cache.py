@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import os
+import time
+import uuid
+
+
+# LRU-кеш с ограничением по размеру и временем жизни записей
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)  # вытесняем самую старую запись
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def remove_where(self, predicate) -> int:
+        # Удаляет записи, значение которых подходит под условие
+        keys = [key for key, (_, value) in self._data.items() if predicate(value)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def remove_keys_where(self, predicate) -> int:
+        # То же, но условие проверяется по ключу записи
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+# Общая для воркеров версия каталога в файле. Каждый воркер сверяет mtime файла
+# (один stat на запрос) и перечитывает версию, только если файл изменился
+class FileVersionNotifier:
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._version = None
+
+    def read(self) -> Optional[str]:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._mtime:
+            with open(self.path) as f:
+                self._version = f.read().strip() or None
+            self._mtime = mtime
+        return self._version
+
+    def publish(self, version: str) -> None:
+        # Запись через временный файл и os.replace, чтобы другие воркеры не прочитали половину строки
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, self.path)
+
+
+# Кеш ответов каталога. Ключ записи включает версию каталога, поэтому после изменения
+# товаров старые записи просто перестают находиться и вытесняются по LRU
+class CatalogCache:
+    def __init__(self, maxsize: int = 256, ttl: float = 60, notifier: Optional[FileVersionNotifier] = None):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.notifier = notifier
+        # Случайная эпоха отличает версии разных запусков процесса
+        self._epoch = uuid.uuid4().hex[:8]
+        self._counter = 0
+
+    @property
+    def version(self) -> str:
+        if self.notifier is not None:
+            shared = self.notifier.read()
+            if shared is not None:
+                return shared
+        return f"{self._counter}-{self._epoch}"
+
+    def bump(self) -> str:
+        # Счётчик продолжаем от текущей (возможно, общей) версии, чтобы он только рос
+        self._counter = int(self.version.split('-')[0]) + 1
+        self._epoch = uuid.uuid4().hex[:8]
+        version = f"{self._counter}-{self._epoch}"
+        if self.notifier is not None:
+            self.notifier.publish(version)
+        self._cache.clear()
+        return version
+
+    # version - значение self.version, прочитанное один раз до запроса к базе. Если во время запроса
+    # каталог изменился, результат ляжет под старой версией и новым запросам не достанется
+    def get(self, version: str, key: Hashable, default: Any = None) -> Any:
+        return self._cache.get((version, key), default)
+
+    def set(self, version: str, key: Hashable, value: Any) -> None:
+        self._cache.set((version, key), value)
+
+    # Точечная очистка без смены версии: predicate получает ключ записи (без версии).
+    # Действует только в этом процессе - записи других воркеров доживут до конца TTL
+    def discard(self, predicate) -> int:
+        return self._cache.remove_keys_where(lambda key: predicate(key[1]))
+
+    def stats(self) -> dict:
+        return {"version": self.version, **self._cache.stats()}
@@ -0,0 +1,132 @@
+from fastapi import HTTPException
+from typing import Optional
+from sqlalchemy import select, func, update, delete, tuple_
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
+from database import dialect_insert
+from models import CartItem, Item as DBItem, Sale
+
+
+def cart_query(user_id: str):
+    # Корзина одним запросом: строки вместе с товарами, суммы по строкам и итог считает база
+    line_total = (CartItem.quantity * DBItem.price).label('line_total')
+    grand_total = func.sum(CartItem.quantity * DBItem.price).over().label('grand_total')
+    return (
+        select(CartItem, line_total, grand_total)
+        .join(CartItem.item)
+        .options(contains_eager(CartItem.item))
+        .where(CartItem.user_id == user_id)
+        .order_by(CartItem.id)
+    )
+
+
+async def load_cart(db: AsyncSession, user_id: str) -> tuple[list, int]:
+    rows = (await db.execute(cart_query(user_id))).all()
+
+    lines = [{"item": row.CartItem.item, "quantity": row.CartItem.quantity, "line_total": row.line_total} for row in rows]
+    total = rows[0].grand_total if rows else 0
+    return lines, total
+
+
+async def add_cart_item(db: AsyncSession, user_id: str, item_id: str, quantity: int) -> int:
+    # Если товар уже в корзине, складываем количество (уникальный индекс user_id + item_id)
+    stmt = dialect_insert(db, CartItem.__table__).values(user_id=user_id, item_id=item_id, quantity=quantity)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CartItem.user_id, CartItem.item_id],
+        set_={"quantity": CartItem.__table__.c.quantity + stmt.excluded.quantity},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+    result = await db.execute(select(CartItem.id).where(CartItem.user_id == user_id, CartItem.item_id == item_id))
+    return result.scalar()
+
+
+async def take_cart_lines(db: AsyncSession, user_id: str) -> list:
+    # Заказ состоит ровно из удалённых строк корзины: товар, добавленный в корзину параллельно,
+    # либо попадает в заказ, либо остаётся в корзине, но не теряется
+    if db.bind.dialect.name == 'postgresql':
+        result = await db.execute(
+            delete(CartItem).where(CartItem.user_id == user_id).returning(CartItem.item_id, CartItem.quantity)
+        )
+        return result.all()
+
+    # Без DELETE ... RETURNING удаляем ровно прочитанные строки с прочитанным количеством;
+    # если корзина за это время изменилась, заказ не оформляется
+    result = await db.execute(select(CartItem.id, CartItem.item_id, CartItem.quantity).where(CartItem.user_id == user_id))
+    lines = result.all()
+    if lines:
+        deleted = await db.execute(
+            delete(CartItem).where(tuple_(CartItem.id, CartItem.quantity).in_([(line.id, line.quantity) for line in lines]))
+        )
+        if deleted.rowcount != len(lines):
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="Корзина изменилась, попробуйте ещё раз")
+    return lines
+
+
+# Конфликты транзакций: заказ не оформлен, но повтор может пройти - это не ошибка сервера
+SERIALIZATION_FAILURES = {'40001', '40P01'}  # serialization_failure, deadlock_detected
+LOCK_TIMEOUTS = {'55P03'}  # lock_not_available
+
+
+def conflict_status(error: DBAPIError) -> Optional[int]:
+    # asyncpg отдаёт код ошибки в sqlstate, psycopg2 - в pgcode; SQLite - только текст
+    code = getattr(error.orig, 'sqlstate', None) or getattr(error.orig, 'pgcode', None)
+    if code in SERIALIZATION_FAILURES:
+        return 409
+    if code in LOCK_TIMEOUTS or 'database is locked' in str(error.orig):
+        return 503
+    return None
+
+
+async def checkout(db: AsyncSession, user_id: str) -> dict:
+    try:
+        return await place_order(db, user_id)
+    except DBAPIError as error:
+        status_code = conflict_status(error)
+        if status_code is None:
+            raise
+        await db.rollback()
+        if status_code == 409:
+            raise HTTPException(status_code=409, detail="Заказ конфликтует с параллельными покупками, попробуйте ещё раз")
+        raise HTTPException(status_code=503, detail="Склад занят, попробуйте позже", headers={"Retry-After": "1"})
+
+
+async def place_order(db: AsyncSession, user_id: str) -> dict:
+    """Оформляет корзину пользователя одной транзакцией: списывает остатки и создаёт продажи.
+
+    Остатки уменьшаются условным UPDATE (quantity >= заказанного), поэтому продать больше,
+    чем есть на складе, нельзя. Строки товаров блокируются в порядке id - при одновременных
+    покупках одних и тех же товаров транзакции ждут друг друга, но не попадают в deadlock.
+    """
+    lines = sorted(await take_cart_lines(db, user_id), key=lambda line: line.item_id)
+    if not lines:
+        raise HTTPException(status_code=400, detail="Корзина пуста")
+
+    oversold = []
+    for line in lines:
+        result = await db.execute(
+            update(DBItem)
+            .where(DBItem.id == line.item_id, DBItem.quantity >= line.quantity)
+            .values(quantity=DBItem.quantity - line.quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            oversold.append(line.item_id)
+
+    if oversold:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail={"message": "Недостаточно товара на складе", "items": oversold})
+
+    # Строки товаров уже заблокированы нашими UPDATE - цены не изменятся до конца транзакции
+    result = await db.execute(select(DBItem.id, DBItem.price).where(DBItem.id.in_([line.item_id for line in lines])))
+    prices = dict(result.all())
+    sales = [Sale(user_id=user_id, item_id=line.item_id, quantity=line.quantity, total_amount=line.quantity * prices[line.item_id])
+             for line in lines]
+    db.add_all(sales)
+    await db.commit()
+
+    return {"items": [{"item_id": sale.item_id, "quantity": sale.quantity, "total_amount": sale.total_amount} for sale in sales],
+            "total": sum(sale.total_amount for sale in sales)}
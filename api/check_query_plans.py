@@ -0,0 +1,125 @@
+"""Проверка планов горячих запросов (PostgreSQL): ни один не должен читать таблицу целиком.
+
+Запросы строятся теми же функциями, что и в обработчиках (keyset_query, cart_query,
+favorite_ids_query, purchases_query и другие), и выполняются с приставкой EXPLAIN - поэтому
+проверяется ровно тот SQL, который отправляет приложение. Запускается после alembic upgrade head:
+
+    python check_query_plans.py [--url postgresql+psycopg2://...]
+
+Последовательное сканирование в тесте запрещается (enable_seqscan = off), поэтому на
+маленькой базе Seq Scan в плане означает, что подходящего индекса нет. Код выхода 1 -
+хотя бы один запрос упал в Seq Scan. Тот же набор проверяет tests/test_query_plans.py,
+если задана переменная окружения TEST_POSTGRES_URL.
+"""
+from sqlalchemy import create_engine, event, select, text
+from database import engine as app_engine
+from models import Item as DBItem
+from pagination import encode_cursor, keyset_query
+import argparse
+import json
+import sys
+
+# Подставляемые значения не важны - планировщик выбирает способ доступа по предикатам
+SAMPLE_ID = '00000000-0000-0000-0000-000000000000'
+PAGE_SIZE = 20
+
+
+def hot_queries():
+    from auth import user_by_email_query
+    from cart import cart_query
+    from favorites import favorite_ids_query
+    from main import (ITEM_FIELDS, ITEM_OUT_FIELDS, ITEM_SORT_KEYS, STOREFRONT_FIELDS, catalog_query, search_query,
+                      item_columns, stock_query)
+    from recommend import related_query, purchases_query
+    from search import build_conditions
+
+    def catalog_page(query, sort, cursor=None):
+        return keyset_query(query, ITEM_SORT_KEYS[sort], cursor, PAGE_SIZE)[0]
+
+    def search(q=None, **facets):
+        return search_query(ITEM_FIELDS, build_conditions('postgresql', q, None, None, facets))
+
+    return {
+        'витрина, первая страница': catalog_page(catalog_query(STOREFRONT_FIELDS, 'id'), 'id'),
+        'витрина, следующая страница': catalog_page(catalog_query(STOREFRONT_FIELDS, 'id'), 'id', encode_cursor([SAMPLE_ID])),
+        'каталог по цене, первая страница': catalog_page(catalog_query(ITEM_OUT_FIELDS, 'price'), 'price'),
+        'каталог по цене, следующая страница': catalog_page(catalog_query(ITEM_OUT_FIELDS, 'price'), 'price',
+                                                            encode_cursor([100, SAMPLE_ID])),
+        'каталог по цене, предыдущая страница': catalog_page(catalog_query(ITEM_OUT_FIELDS, 'price'), 'price',
+                                                             encode_cursor([100, SAMPLE_ID], 'prev')),
+        'каталог с фильтрами': catalog_page(search(pol=['м'], types=['обувь']), 'id'),
+        'поиск': catalog_page(search('куртка'), 'id'),
+        'товар по id': select(DBItem).where(DBItem.id == SAMPLE_ID),
+        'остатки товаров страницы': stock_query([SAMPLE_ID]),
+        'рекомендации товара': related_query(SAMPLE_ID, item_columns(ITEM_FIELDS, [DBItem.id])),
+        'вход по email': user_by_email_query('user@example.com'),
+        'корзина пользователя': cart_query(SAMPLE_ID),
+        'избранное пользователя': favorite_ids_query(SAMPLE_ID),
+        'покупки пользователя': purchases_query(SAMPLE_ID),
+    }
+
+
+def seq_scans(plan: dict):
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan.get('Relation Name')
+    for child in plan.get('Plans', []):
+        yield from seq_scans(child)
+
+
+def explain(conn, statement) -> dict:
+    # Запрос выполняется как обычно, но с приставкой EXPLAIN; план забираем прямо из курсора,
+    # потому что колонки результата уже не совпадают с колонками запроса
+    plans = []
+
+    def add_explain(conn, cursor, sql, parameters, context, executemany):
+        return f"EXPLAIN (FORMAT JSON) {sql}", parameters
+
+    def fetch_plan(conn, cursor, sql, parameters, context, executemany):
+        plans.append(cursor.fetchone()[0])
+
+    event.listen(conn, 'before_cursor_execute', add_explain, retval=True)
+    event.listen(conn, 'after_cursor_execute', fetch_plan)
+    try:
+        conn.execute(statement).close()
+    finally:
+        event.remove(conn, 'before_cursor_execute', add_explain)
+        event.remove(conn, 'after_cursor_execute', fetch_plan)
+    plan = plans[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def check_plans(engine) -> dict:
+    """Возвращает {название запроса: таблицы, которые он читает целиком}."""
+    failures = {}
+    with engine.connect() as conn:
+        conn.execute(text("SET enable_seqscan = off"))
+        for name, statement in hot_queries().items():
+            tables = list(seq_scans(explain(conn, statement)))
+            if tables:
+                failures[name] = tables
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help="по умолчанию URL_DATABASE")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url) if args.url else app_engine
+    if engine.dialect.name != 'postgresql':
+        print("Проверка планов рассчитана на PostgreSQL")
+        return 0
+
+    failures = check_plans(engine)
+    for name in hot_queries():
+        if name in failures:
+            print(f"FAIL {name}: Seq Scan по {', '.join(failures[name])}")
+        else:
+            print(f"ok   {name}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
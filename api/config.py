@@ -1 +1,79 @@
-URL_DATABASE = 'postgresql+psycopg2://postgres:pass123@db:5432/shop'
\ No newline at end of file
+import os
+
+URL_DATABASE = os.getenv('URL_DATABASE', 'postgresql+psycopg2://postgres:pass123@db:5432/shop')
+
+# Асинхронное подключение (используется в обработчиках FastAPI)
+ASYNC_URL_DATABASE = os.getenv('ASYNC_URL_DATABASE', 'postgresql+asyncpg://postgres:pass123@db:5432/shop')
+
+# Настройки пула соединений
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 20))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+# SQLite пишет одним соединением за раз: лишние соединения только ждут блокировку файла
+DB_SQLITE_POOL_SIZE = int(os.getenv('DB_SQLITE_POOL_SIZE', 5))
+
+# Пул для хеширования паролей (bcrypt): "thread" или "process"
+HASH_EXECUTOR = os.getenv('HASH_EXECUTOR', 'thread')
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', 4))
+# Сколько задач может ждать в очереди сверх занятых воркеров, дальше отвечаем 503
+HASH_QUEUE_LIMIT = int(os.getenv('HASH_QUEUE_LIMIT', 32))
+
+# Кеш проверенных токенов доступа
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+# Файл, через который воркеры узнают о смене ролей и удалении пользователей
+# (пусто - отзыв токенов действует только в процессе, где он произошёл; годится для одного воркера)
+TOKEN_REVOCATION_FILE = os.getenv('TOKEN_REVOCATION_FILE', '')
+
+# Кеш каталога товаров
+CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 256))
+CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 60))
+# Путь к файлу с версией каталога, общему для всех воркеров (пусто - только в пределах процесса)
+CATALOG_VERSION_FILE = os.getenv('CATALOG_VERSION_FILE', '')
+
+# Массовая загрузка каталога
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 5000))
+IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', 1000))
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+
+# Страницы админки
+ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', 50))
+
+# Журнал медленных запросов (вместе с SQL), порог в миллисекундах; 0 - выключен
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 0))
+
+# Заголовки кеширования (браузер и CDN перепроверяют ответ по ETag)
+CATALOG_CACHE_CONTROL = os.getenv('CATALOG_CACHE_CONTROL', 'public, no-cache')
+# Статика без хеша в имени (css, оригиналы картинок) тоже перепроверяется, иначе после выкладки
+# браузеры до суток видят старую версию; уменьшенные копии в variants/ - immutable
+STATIC_CACHE_CONTROL = os.getenv('STATIC_CACHE_CONTROL', 'public, no-cache')
+
+# Уменьшенные копии картинок товаров
+STATIC_DIR = os.getenv('STATIC_DIR', './static')
+IMAGE_WIDTHS = tuple(int(width) for width in os.getenv('IMAGE_WIDTHS', '160,320,640').split(','))
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 80))
+IMAGE_EXECUTOR = os.getenv('IMAGE_EXECUTOR', 'thread')
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# Кеш избранного пользователей
+FAVORITES_CACHE_SIZE = int(os.getenv('FAVORITES_CACHE_SIZE', 10000))
+FAVORITES_CACHE_TTL = int(os.getenv('FAVORITES_CACHE_TTL', 60))
+
+# Ограничение частоты входа и регистрации (token bucket), формат "попыток/секунд"
+LOGIN_RATE_PER_IP = os.getenv('LOGIN_RATE_PER_IP', '20/60')
+LOGIN_RATE_PER_EMAIL = os.getenv('LOGIN_RATE_PER_EMAIL', '5/60')
+REGISTER_RATE_PER_IP = os.getenv('REGISTER_RATE_PER_IP', '5/60')
+# Где хранятся вёдра: "memory" (в каждом процессе свои) или "sqlite" (общие для воркеров)
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_SQLITE_PATH = os.getenv('RATE_LIMIT_SQLITE_PATH', '/tmp/shop-ratelimit.db')
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))
+# Сколько доверенных прокси стоит перед приложением. 0 - адрес берётся из соединения;
+# N - из X-Forwarded-For, N-й адрес справа (его дописал наш прокси, левее - что прислал клиент)
+RATE_LIMIT_PROXY_HOPS = int(os.getenv('RATE_LIMIT_PROXY_HOPS', 0))
+
+# Рекомендации "часто покупают вместе": сколько соседей хранить на товар
+# и сколько покупателей обрабатывать за одну пачку при полном пересчёте
+RELATED_ITEMS_LIMIT = int(os.getenv('RELATED_ITEMS_LIMIT', 10))
+RECOMMEND_BATCH_USERS = int(os.getenv('RECOMMEND_BATCH_USERS', 5000))
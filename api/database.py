@@ -1,10 +1,96 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, CHAR
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from config import URL_DATABASE
+import os
+import time
+import uuid
+from config import (URL_DATABASE, ASYNC_URL_DATABASE, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+                    DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_SQLITE_POOL_SIZE)
 
 
+def _pool_options(url: str) -> dict:
+    if url.startswith('sqlite'):
+        # База в памяти живёт в одном соединении - её пул SQLAlchemy выбирает сам
+        if ':memory:' in url or url.endswith('://'):
+            return {}
+        # Пул по умолчанию зависит от версии SQLAlchemy (в 1.4 это NullPool - соединение на каждую
+        # сессию), поэтому задаём его явно: при всплеске запросов они ждут в пуле, а не в блокировке файла
+        return {
+            "poolclass": AsyncAdaptedQueuePool,
+            "pool_size": DB_SQLITE_POOL_SIZE,
+            "max_overflow": 0,
+            "pool_timeout": DB_POOL_TIMEOUT,
+        }
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+# Синхронный движок (создание таблиц, скрипты)
 engine = create_engine(URL_DATABASE)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+# Асинхронный движок для обработчиков, чтобы запросы не блокировали event loop
+async_engine = create_async_engine(ASYNC_URL_DATABASE, **_pool_options(ASYNC_URL_DATABASE))
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+Base = declarative_base()
+
+
+def uuid7() -> uuid.UUID:
+    """UUID версии 7: первые 48 бит - время в миллисекундах, остальное случайное.
+
+    Новые ключи идут по возрастанию, поэтому вставки попадают в конец B-tree индекса,
+    а не в случайные страницы, как с uuid4.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    value = value & ~(0xF << 76) | (0x7 << 76)  # версия 7
+    value = value & ~(0x3 << 62) | (0x2 << 62)  # вариант RFC 4122
+    return uuid.UUID(int=value)
+
+
+# Идентификатор: нативный uuid (16 байт) в PostgreSQL, 32 hex-символа в SQLite.
+# В Python значения всегда строки в стандартном виде, как и раньше
+class GUID(TypeDecorator):
+    impl = CHAR(32)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(UUID(as_uuid=True))
+        return dialect.type_descriptor(CHAR(32))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if not isinstance(value, uuid.UUID):
+            value = uuid.UUID(str(value))
+        return value if dialect.name == 'postgresql' else value.hex
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return str(value if isinstance(value, uuid.UUID) else uuid.UUID(str(value)))
+
+
+# Функция для получения сессии базы данных
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# INSERT с поддержкой ON CONFLICT для диалекта текущей сессии
+def dialect_insert(db: AsyncSession, table):
+    if db.bind.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
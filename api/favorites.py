@@ -0,0 +1,71 @@
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import TTLCache
+from config import FAVORITES_CACHE_SIZE, FAVORITES_CACHE_TTL
+from database import dialect_insert
+from models import FavoriteItem, Item as DBItem
+import uuid
+
+# Множество id избранных товаров пользователя: user_id -> frozenset
+favorites_cache = TTLCache(maxsize=FAVORITES_CACHE_SIZE, ttl=FAVORITES_CACHE_TTL)
+
+# Версия избранного пользователя в этом процессе - случайная метка, новая после каждого изменения.
+# По ней favorite_ids замечает изменение во время запроса; в ETag она не идёт, потому что другие
+# воркеры о ней не знают. Если метку вытеснили из ограниченного кеша, выдаётся новая
+_versions = TTLCache(maxsize=FAVORITES_CACHE_SIZE, ttl=24 * 3600)
+
+
+def favorites_version(user_id: str) -> str:
+    version = _versions.get(user_id)
+    if version is None:
+        version = uuid.uuid4().hex[:12]
+        _versions.set(user_id, version)
+    return version
+
+
+def _invalidate(user_id: str):
+    favorites_cache.pop(user_id)
+    _versions.set(user_id, uuid.uuid4().hex[:12])
+
+
+def favorite_ids_query(user_id: str):
+    return select(FavoriteItem.item_id).where(FavoriteItem.user_id == user_id)
+
+
+async def favorite_ids(db: AsyncSession, user_id: str) -> frozenset:
+    # Один запрос на пользователя, дальше отметки "в избранном" проверяются по множеству в памяти
+    ids = favorites_cache.get(user_id)
+    if ids is None:
+        # Версию запоминаем до запроса: если избранное изменили, пока запрос шёл, в кеш
+        # устаревшее множество не кладём
+        version = favorites_version(user_id)
+        result = await db.execute(favorite_ids_query(user_id))
+        ids = frozenset(result.scalars().all())
+        if favorites_version(user_id) == version:
+            favorites_cache.set(user_id, ids)
+    return ids
+
+
+async def list_favorites(db: AsyncSession, user_id: str) -> list:
+    query = (
+        select(DBItem)
+        .join(FavoriteItem, FavoriteItem.item_id == DBItem.id)
+        .where(FavoriteItem.user_id == user_id)
+        .order_by(FavoriteItem.id)
+    )
+    return (await db.execute(query)).scalars().all()
+
+
+async def add_favorite(db: AsyncSession, user_id: str, item_id: str):
+    # Уникальный индекс (user_id, item_id) не даёт добавить товар дважды
+    stmt = dialect_insert(db, FavoriteItem.__table__).values(user_id=user_id, item_id=item_id)
+    await db.execute(stmt.on_conflict_do_nothing(index_elements=[FavoriteItem.user_id, FavoriteItem.item_id]))
+    await db.commit()
+    _invalidate(user_id)
+
+
+async def remove_favorite(db: AsyncSession, user_id: str, item_id: str) -> bool:
+    result = await db.execute(delete(FavoriteItem).where(FavoriteItem.user_id == user_id, FavoriteItem.item_id == item_id))
+    await db.commit()
+    _invalidate(user_id)
+    return result.rowcount > 0
@@ -0,0 +1,52 @@
+from fastapi import Request, Response
+from fastapi.staticfiles import StaticFiles
+from typing import Optional
+import hashlib
+
+
+def make_etag(*parts) -> str:
+    # Сильный ETag: одинаковый для одинаковых версии каталога и параметров запроса
+    raw = '|'.join(str(part) for part in parts)
+    return '"' + hashlib.sha1(raw.encode()).hexdigest()[:20] + '"'
+
+
+def not_modified(request: Request, etag: str, cache_control: str, vary: Optional[str] = None) -> Optional[Response]:
+    """Если клиент прислал совпадающий If-None-Match, возвращает готовый ответ 304."""
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return None
+    # Прокси, сжимающие ответ (например, gzip в nginx), превращают сильный ETag в слабый W/"...";
+    # для If-None-Match достаточно слабого сравнения, поэтому префикс отбрасываем
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    tags = [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+    if etag not in tags and '*' not in tags:
+        return None
+    return Response(status_code=304, headers=cache_headers(etag, cache_control, vary))
+
+
+def cache_headers(etag: str, cache_control: str, vary: Optional[str] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if vary:
+        headers["Vary"] = vary
+    return headers
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles с заголовком Cache-Control (ETag и 304 StaticFiles уже поддерживает)."""
+
+    def __init__(self, *args, cache_control: str = 'public, no-cache', immutable_prefix: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+        self.immutable_prefix = immutable_prefix
+
+    def cache_control_for(self, path: str) -> str:
+        # Файлы с адресом по хешу содержимого никогда не меняются
+        if self.immutable_prefix and path.startswith(self.immutable_prefix):
+            return 'public, max-age=31536000, immutable'
+        return self.cache_control
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = self.cache_control_for(path)
+        return response
@@ -0,0 +1,208 @@
+"""Уменьшенные WebP-копии картинок товаров.
+
+Копии лежат в static/variants/<хеш содержимого>/<ширина>.webp: имя зависит только от
+содержимого исходника, поэтому их можно кешировать навсегда (immutable). Соответствие
+image_url -> хеш хранится в static/variants/manifest.json.
+
+Заполнить копии для уже существующего каталога:
+    python images.py backfill
+"""
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Iterable, Optional
+from config import CATALOG_VERSION_FILE, STATIC_DIR, IMAGE_WIDTHS, IMAGE_QUALITY, IMAGE_EXECUTOR, IMAGE_WORKERS
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow не установлен - отдаём только оригиналы
+    Image = None
+
+logger = logging.getLogger("shop.images")
+
+VARIANTS_DIR = os.path.join(STATIC_DIR, 'variants')
+VARIANTS_URL = '/static/variants'
+MANIFEST_PATH = os.path.join(VARIANTS_DIR, 'manifest.json')
+
+# Манифест пишут и воркеры, и backfill: каждый процесс сверяет mtime файла (один stat)
+# и перечитывает его, только если файл изменился
+_manifest_lock = threading.Lock()
+_manifest_stamp = None
+
+
+def _manifest_stat() -> Optional[tuple]:
+    try:
+        # Файл каждый раз заменяется через os.replace, поэтому новый inode виден даже при грубом mtime
+        stat = os.stat(MANIFEST_PATH)
+        return stat.st_ino, stat.st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def reload_manifest() -> dict:
+    global manifest, _manifest_stamp
+    stamp = _manifest_stat()
+    if stamp != _manifest_stamp:
+        # Словарь заменяется целиком: читатели в других потоках видят либо старый, либо новый
+        manifest = load_manifest()
+        _manifest_stamp = stamp
+    return manifest
+
+
+manifest = {}
+reload_manifest()
+
+
+def save_manifest():
+    global _manifest_stamp
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=VARIANTS_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f)
+    os.chmod(tmp_path, 0o644)  # mkstemp создаёт файл 0600, а статику читает веб-сервер
+    os.replace(tmp_path, MANIFEST_PATH)
+    _manifest_stamp = _manifest_stat()
+
+
+def update_manifest(digests: dict) -> bool:
+    """Дописывает image_url -> хеш в манифест; False, если ничего не изменилось."""
+    with _manifest_lock:
+        # Перед записью подтягиваем то, что добавили другие воркеры, чтобы не затереть их картинки
+        current = reload_manifest()
+        if all(current.get(image_url) == digest for image_url, digest in digests.items()):
+            return False
+        current.update(digests)
+        save_manifest()
+        return True
+
+
+def local_path(image_url: str) -> Optional[str]:
+    # Обрабатываем только картинки из нашей папки static
+    path = image_url.split('?', 1)[0].lstrip('/')
+    if not path.startswith('static/') or '..' in path:
+        return None
+    return os.path.join(STATIC_DIR, path[len('static/'):])
+
+
+def generate_variants(source_path: str, widths: tuple = IMAGE_WIDTHS, quality: int = IMAGE_QUALITY) -> str:
+    """Создаёт копии нужной ширины и возвращает хеш исходника. Выполняется в пуле воркеров."""
+    with open(source_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:16]
+
+    target_dir = os.path.join(VARIANTS_DIR, digest)
+    if all(os.path.exists(os.path.join(target_dir, f"{width}.webp")) for width in widths):
+        return digest
+
+    os.makedirs(target_dir, exist_ok=True)
+    with Image.open(source_path) as original:
+        original = original.convert('RGBA' if original.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for width in widths:
+            image = original.copy()
+            # Не увеличиваем картинки меньше нужной ширины
+            if image.width > width:
+                image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            # Одинаковую картинку могут обрабатывать несколько потоков и процессов сразу,
+            # поэтому у каждого свой временный файл
+            fd, tmp_path = tempfile.mkstemp(dir=target_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    image.save(f, 'WEBP', quality=quality)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, os.path.join(target_dir, f"{width}.webp"))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+    return digest
+
+
+def image_srcset(image_url: Optional[str]) -> Optional[str]:
+    digest = reload_manifest().get(image_url) if image_url else None
+    if not digest:
+        return None
+    return ', '.join(f"{VARIANTS_URL}/{digest}/{width}.webp {width}w" for width in IMAGE_WIDTHS)
+
+
+if IMAGE_EXECUTOR == 'process':
+    image_executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+else:
+    image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='images')
+
+
+def schedule_variants(image_urls: Iterable[str], on_complete: Optional[Callable[[], None]] = None):
+    """Ставит создание копий в фоновый пул.
+
+    Манифест записывается и on_complete вызывается один раз - когда готова вся пачка.
+    """
+    if Image is None:
+        return
+
+    pending = {}
+    for image_url in set(image_urls):
+        source_path = local_path(image_url) if image_url else None
+        if source_path is not None and os.path.isfile(source_path):
+            pending[image_url] = None
+    if not pending:
+        return
+
+    digests = {}
+    lock = threading.Lock()
+
+    def done(image_url, future):
+        try:
+            digests[image_url] = future.result()
+        except Exception:
+            logger.exception("Не удалось обработать картинку %s", image_url)
+        with lock:
+            del pending[image_url]
+            if pending:
+                return
+        if update_manifest(digests) and on_complete is not None:
+            on_complete()
+
+    for image_url in list(pending):
+        future = image_executor.submit(generate_variants, local_path(image_url))
+        future.add_done_callback(lambda future, image_url=image_url: done(image_url, future))
+
+
+def backfill():
+    from sqlalchemy import select
+    from database import SessionLocal
+    from models import Item as DBItem
+
+    if Image is None:
+        sys.exit("Для обработки картинок нужен Pillow")
+
+    with SessionLocal() as db:
+        image_urls = db.execute(select(DBItem.image_url).distinct()).scalars().all()
+
+    futures = {}
+    for image_url in image_urls:
+        source_path = local_path(image_url) if image_url else None
+        if source_path is not None and os.path.isfile(source_path):
+            futures[image_url] = image_executor.submit(generate_variants, source_path)
+
+    update_manifest({image_url: future.result() for image_url, future in futures.items()})
+    # Запущенные воркеры перечитают манифест по mtime, а кеш каталога сбросят по общей версии
+    if CATALOG_VERSION_FILE:
+        from cache import CatalogCache, FileVersionNotifier
+        CatalogCache(notifier=FileVersionNotifier(CATALOG_VERSION_FILE)).bump()
+    print(f"Обработано картинок: {len(futures)}")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['backfill']:
+        sys.exit("Использование: python images.py backfill")
+    backfill()
@@ -1,68 +1,232 @@
-from fastapi import FastAPI, Depends, HTTPException, Request, Cookie, status, Path, Header,APIRouter
+from fastapi import FastAPI, Depends, HTTPException, Request, Cookie, status, Path, Header,APIRouter, Query, UploadFile, File
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import Response, HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response, HTMLResponse, JSONResponse, ORJSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.responses import Response
-from database import SessionLocal, engine, Base
+from database import async_engine, get_db
 from models import User as DBUser, Item as DBItem, FavoriteItem, CartItem
 from pydantic import BaseModel
-from validation import User, UserCreate, Token, Item, ItemCreate, validate_user_create, UserUpdate, CartItemCreate
+from validation import User, UserCreate, Token, Item, ItemCreate, ItemOut, ItemFields, FavoriteOut, validate_user_create, UserUpdate, CartItemCreate, Principal
 from typing import Optional
 from auth import *
+from pagination import keyset_page, iterate_keyset
+from search import build_conditions, all_conditions, facet_counts
+from bulk import detect_format, import_items, export_items
+from cart import load_cart, add_cart_item, checkout
+from favorites import favorite_ids, list_favorites, add_favorite, remove_favorite
+from typing import List
+from cache import CatalogCache, FileVersionNotifier
+from config import CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL, CATALOG_VERSION_FILE, ADMIN_PAGE_SIZE, SLOW_REQUEST_MS
+from metrics import Metrics, MetricsMiddleware
+from http_cache import make_etag, not_modified, cache_headers, CachedStaticFiles
+from config import CATALOG_CACHE_CONTROL, STATIC_CACHE_CONTROL, STATIC_DIR
+from images import image_srcset, schedule_variants
+from recommend import related_items, record_purchases
+from config import RELATED_ITEMS_LIMIT
+from ratelimit import RateLimiter, MemoryBucketStore, SQLiteBucketStore, client_ip
+from config import (LOGIN_RATE_PER_IP, LOGIN_RATE_PER_EMAIL, REGISTER_RATE_PER_IP, RATE_LIMIT_BACKEND,
+                    RATE_LIMIT_SQLITE_PATH, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_PROXY_HOPS)
+import asyncio
+import auth
 import uuid
 
-# подключение библиотеки
-app = FastAPI()
+# подключение библиотеки; JSON-ответы сериализуются через orjson
+app = FastAPI(default_response_class=ORJSONResponse)
 
 router = APIRouter()
 
+# Метрики по маршрутам и SQL-запросам, отдаются на /metrics
+metrics = Metrics(slow_request_ms=SLOW_REQUEST_MS)
+metrics.instrument_engine(async_engine.sync_engine)
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # Подключаем папку с шаблонами(HTML)
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["image_srcset"] = image_srcset
+
+# Асинхронное окружение Jinja2 для потоковой отдачи больших страниц (generate_async)
+stream_templates = Environment(loader=FileSystemLoader("templates"), autoescape=select_autoescape(), enable_async=True)
+
+
+def stream_template(name: str, context: dict) -> StreamingResponse:
+    template = stream_templates.get_template(name)
+    return StreamingResponse(template.generate_async(**context), media_type="text/html")
 
 # Подключаем папку с статическими файлами (изображениями и css)
-app.mount("/static", StaticFiles(directory="./static"), name="static")
+app.mount("/static", CachedStaticFiles(directory=STATIC_DIR, cache_control=STATIC_CACHE_CONTROL, immutable_prefix="variants/"), name="static")
 
-# Создание таблиц в базе данных(запуск engine)
-Base.metadata.create_all(bind=engine)
+# Таблицы создаются и обновляются миграциями отдельно от запуска приложения: alembic upgrade head
 
 
-# Функция для получения сессии базы данных
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Ключи сортировки каталога для keyset-пагинации (последним всегда идёт id)
+ITEM_SORT_KEYS = {
+    'id': [DBItem.id],
+    'price': [DBItem.price, DBItem.id],
+}
+
+# Поля товара, которые можно запросить через fields= (image_srcset вычисляется по image_url)
+ITEM_FIELDS = tuple(column.key for column in DBItem.__table__.columns) + ('image_srcset',)
+ITEM_OUT_FIELDS = tuple(ItemOut.__fields__)
+
+# Остаток меняется каждым заказом, не меняя версию каталога. Поэтому в закешированных страницах
+# он может быть устаревшим и перед ответом читается заново одним запросом по id товаров страницы
+STOCK_FIELD = 'quantity'
+# Витрина остатки не показывает - её страницы обходятся без этого запроса
+STOREFRONT_FIELDS = tuple(field for field in ITEM_FIELDS if field != STOCK_FIELD)
+
+# Кеш страниц каталога; сбрасывается при любом изменении товаров
+catalog_cache = CatalogCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL,
+                             notifier=FileVersionNotifier(CATALOG_VERSION_FILE) if CATALOG_VERSION_FILE else None)
+
+metrics.register_gauge('cache_stats', 'Размер и попадания кешей каталога и токенов', lambda: {
+    (('cache', name), ('stat', stat)): value
+    for name, cache_stats in (('catalog', catalog_cache.stats()), ('tokens', auth.token_cache.stats()))
+    for stat, value in cache_stats.items() if stat != 'version'
+})
+metrics.register_gauge('password_hash_in_flight', 'Задачи bcrypt в пуле (выполняются и ждут)',
+                       lambda: {(): auth.hash_in_flight})
+
+# Ограничение попыток входа и регистрации: проверяется до запроса к базе и bcrypt
+rate_limit_store = (SQLiteBucketStore(RATE_LIMIT_SQLITE_PATH) if RATE_LIMIT_BACKEND == 'sqlite'
+                    else MemoryBucketStore(maxsize=RATE_LIMIT_MAX_KEYS))
+login_ip_limiter = RateLimiter('login-ip', LOGIN_RATE_PER_IP, rate_limit_store)
+login_email_limiter = RateLimiter('login-email', LOGIN_RATE_PER_EMAIL, rate_limit_store)
+register_ip_limiter = RateLimiter('register-ip', REGISTER_RATE_PER_IP, rate_limit_store)
+
+metrics.register_gauge('rate_limit_requests', 'Попытки входа и регистрации, пропущенные и отклонённые ограничителем', lambda: {
+    (('limiter', limiter.name), ('result', result)): value
+    for limiter in (login_ip_limiter, login_email_limiter, register_ip_limiter)
+    for result, value in limiter.stats().items()
+})
+
+
+def item_to_dict(item: DBItem) -> dict:
+    data = {column.key: getattr(item, column.key) for column in DBItem.__table__.columns}
+    data["image_srcset"] = image_srcset(item.image_url)
+    return data
+
+
+def parse_item_fields(fields: Optional[str], default: tuple) -> tuple:
+    if not fields:
+        return default
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+    unknown = [field for field in requested if field not in ITEM_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"Неизвестные поля: {', '.join(unknown)}")
+    return requested
+
+
+def item_columns(fields: tuple, key_columns: list) -> list:
+    # В SELECT попадают только запрошенные колонки и ключ сортировки (он нужен для курсоров)
+    names = [field for field in fields if field != 'image_srcset']
+    if 'image_srcset' in fields:
+        names.append('image_url')
+    names.extend(column.key for column in key_columns)
+    return [DBItem.__table__.c[name] for name in dict.fromkeys(names)]
+
+
+def item_row_to_dict(row, fields: tuple) -> dict:
+    data = {field: row[field] for field in fields if field != 'image_srcset'}
+    if 'image_srcset' in fields:
+        data["image_srcset"] = image_srcset(row['image_url'])
+    return data
+
+
+def refresh_images(image_urls):
+    # Копии картинок создаются в фоне; когда готова вся пачка, сбрасываем кеш каталога, чтобы появился srcset
+    loop = asyncio.get_running_loop()
+
+    def on_complete():
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(catalog_cache.bump)
+
+    schedule_variants(image_urls, on_complete=on_complete)
+
+
+def stock_query(ids: list):
+    return select(DBItem.id, DBItem.quantity).where(DBItem.id.in_(ids))
+
+
+async def attach_stock(db: AsyncSession, items: list, ids: list, fields: tuple) -> list:
+    if STOCK_FIELD not in fields or not items:
+        return items
+    result = await db.execute(stock_query(ids))
+    stock = dict(result.all())
+    return [{**item, STOCK_FIELD: stock.get(item_id, 0)} for item, item_id in zip(items, ids)]
+
+
+def stock_etag(etag: str, items: list, fields: tuple) -> str:
+    # Без остатков ответ определяется версией каталога, с ними - ещё и текущими остатками
+    if STOCK_FIELD not in fields:
+        return etag
+    return make_etag(etag, [item[STOCK_FIELD] for item in items])
+
+
+def catalog_query(fields: tuple, sort: str):
+    # Строки читаются кортежами нужных колонок, без создания ORM-объектов
+    return select(*item_columns(fields, ITEM_SORT_KEYS[sort]))
+
+
+def search_query(fields: tuple, conditions: dict):
+    return select(*item_columns(fields, ITEM_SORT_KEYS['id'])).where(*all_conditions(conditions))
+
+
+async def load_catalog_page(db: AsyncSession, version: str, skip: int, limit: int, cursor: Optional[str], sort: str,
+                            fields: tuple = ITEM_FIELDS):
+    key = (skip, limit, cursor, sort, fields)
+    page = catalog_cache.get(version, key)
+    if page is not None:
+        items, next_cursor, prev_cursor, ids = page
+        return await attach_stock(db, items, ids, fields), next_cursor, prev_cursor
+
+    page = await read_catalog_page(db, skip, limit, cursor, sort, fields)
+    catalog_cache.set(version, key, page)
+    return page[:3]
+
+
+async def read_catalog_page(db: AsyncSession, skip: int, limit: int, cursor: Optional[str], sort: str, fields: tuple):
+    next_cursor = prev_cursor = None
+    query = catalog_query(fields, sort)
+    # skip оставлен для старых клиентов; без него страницы листаются курсорами
+    if skip and not cursor:
+        result = await db.execute(query.order_by(*ITEM_SORT_KEYS[sort]).offset(skip).limit(limit))
+        rows = result.all()
+    else:
+        rows, next_cursor, prev_cursor = await keyset_page(db, query, ITEM_SORT_KEYS[sort], cursor, limit, scalars=False)
+
+    # В кеше храним готовые словари и id товаров (по ним читаются остатки)
+    return [item_row_to_dict(row._mapping, fields) for row in rows], next_cursor, prev_cursor, [row.id for row in rows]
 
 
 # Создание пользователя(регистрация)
 @app.post("/users/", response_model=User, tags=['registration'])
-async def create_user(response: Response, user_create: UserCreate, db: Session = Depends(get_db)):
+async def create_user(request: Request, response: Response, user_create: UserCreate, db: AsyncSession = Depends(get_db)):
+    await register_ip_limiter.check(client_ip(request, RATE_LIMIT_PROXY_HOPS))
     validated_user = validate_user_create(user_create.dict())  # Проводим валидацию данных пользователя
     if validated_user is None:
         response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
         return {"detail": "Введены неверные данные пользователя"}
 
-    user_id = str(uuid.uuid4())
-    hashed_password = hash_password(validated_user.password)  # Используем валидированные данные
-    db_user = DBUser(id=user_id, username=validated_user.username, email=validated_user.email, password=hashed_password)
+    hashed_password = await hash_password_async(validated_user.password)  # Используем валидированные данные
+    db_user = DBUser(username=validated_user.username, email=validated_user.email, password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
-    access_token = create_access_token({"user_id": user_id})
+    access_token = create_access_token(db_user.id, db_user.role)
     response.set_cookie(key="access_token", value=access_token, httponly=True)
-    print(access_token)
     return {"username": validated_user.username, "email": validated_user.email}
 
 
 
 #пут запрос для суперадмина(изменение роли)
 @app.put("/users/{user_id}", response_model=UserUpdate, tags=['users'])
-async def update_user(user_id: str, user_update: UserUpdate, db: Session = Depends(get_db)):
-    db_user = db.query(DBUser).filter(DBUser.id == user_id).first()
+async def update_user(user_id: uuid.UUID, user_update: UserUpdate, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(DBUser).filter(DBUser.id == user_id))
+    db_user = result.scalars().first()
     
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -71,8 +235,12 @@ async def update_user(user_id: str, user_update: UserUpdate, db: Session = Depen
     for key, value in updated_data.items():
         setattr(db_user, key, value)
     
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+
+    # Роль хранится в токене, поэтому закешированные токены пользователя больше не действительны
+    if "role" in updated_data:
+        invalidate_user_tokens(str(user_id))
     
     return db_user
 
@@ -83,63 +251,59 @@ class Token(BaseModel):
 
 #гет запрос для суперадмина(только он может сюда перейти)
 @app.get("/superadmin", response_class=HTMLResponse, tags=['users'])
-async def get_superadmin_page(request: Request, access_token: str = Cookie(None), db: Session = Depends(get_db)):
-    current_user_id = None
-    current_user_role = None
+async def get_superadmin_page(request: Request, cursor: Optional[str] = None, stream: bool = False,
+                              principal: Principal = Depends(require_role('superadmin')), db: AsyncSession = Depends(get_db)):
+    # Загружаем только колонки, которые выводятся в таблице
+    query = select(DBUser.id, DBUser.email, DBUser.role)
 
-    if not access_token:
-        raise HTTPException(status_code=401, detail="User is not authenticated")
+    # stream=true - весь список потоком, память не зависит от размера таблицы
+    if stream:
+        users = iterate_keyset(db, query, [DBUser.id], ADMIN_PAGE_SIZE, scalars=False)
+        return stream_template("superadmin.html", {"request": request, "users": users})
 
-    current_user_id = get_user_id_from_access_token(access_token)
+    users, next_cursor, prev_cursor = await keyset_page(db, query, [DBUser.id], cursor, ADMIN_PAGE_SIZE, scalars=False)  # Получаем страницу пользователей
 
-    if not current_user_id:
-        raise HTTPException(status_code=401, detail="Invalid access token")
-
-    current_user_role = get_user_role_by_id(db, current_user_id)
-
-    if current_user_role != 'superadmin':
-        raise HTTPException(status_code=403, detail="You are not authorized to access this page")
-
-    users = db.query(DBUser).all()  # Получаем всех пользователей из базы данных
-
-    return templates.TemplateResponse("superadmin.html", {"request": request, "users": users})
+    return templates.TemplateResponse("superadmin.html", {"request": request, "users": users,
+                                                          "next_cursor": next_cursor, "prev_cursor": prev_cursor})
 
 
 #гет запрос для админа(только он может сюда перейти)
 @app.get("/admin", response_class=HTMLResponse, tags=['users'])
-async def get_superadmin_page(request: Request, access_token: str = Cookie(None), db: Session = Depends(get_db)):
-    current_user_id = None
-    current_user_role = None
-
-    if not access_token:
-        raise HTTPException(status_code=401, detail="User is not authenticated")
-
-    current_user_id = get_user_id_from_access_token(access_token)
-
-    if not current_user_id:
-        raise HTTPException(status_code=401, detail="Invalid access token")
-
-    current_user_role = get_user_role_by_id(db, current_user_id)
+async def get_superadmin_page(request: Request, cursor: Optional[str] = None, stream: bool = False,
+                              principal: Principal = Depends(require_role('admin')), db: AsyncSession = Depends(get_db)):
+    query = select(DBItem.id, DBItem.title, DBItem.image_url)
 
-    if current_user_role != 'admin':
-        raise HTTPException(status_code=403, detail="You are not authorized to access this page")
+    if stream:
+        items = iterate_keyset(db, query, [DBItem.id], ADMIN_PAGE_SIZE, scalars=False)
+        return stream_template("admin.html", {"request": request, "items": items})
 
-    item = db.query(DBItem).all()  # Получаем всех пользователей из базы данных
+    item, next_cursor, prev_cursor = await keyset_page(db, query, [DBItem.id], cursor, ADMIN_PAGE_SIZE, scalars=False)  # Получаем страницу товаров
 
-    return templates.TemplateResponse("admin.html", {"request": request, "items": item})
+    return templates.TemplateResponse("admin.html", {"request": request, "items": item,
+                                                     "next_cursor": next_cursor, "prev_cursor": prev_cursor})
 
 @app.post("/login/",  tags=['registration'])
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = get_user_by_email(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.password):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    await login_ip_limiter.check(client_ip(request, RATE_LIMIT_PROXY_HOPS))
+    await login_email_limiter.check(form_data.username.strip().lower())
+    user = await get_user_by_email(db, form_data.username)
+    if not user:
         raise HTTPException(status_code=401, detail="Неверный email или пароль")
 
-    access_token = create_access_token({"sub": user.id})
+    verified, new_hash = await verify_and_update_password_async(form_data.password, user.password)
+    if not verified:
+        raise HTTPException(status_code=401, detail="Неверный email или пароль")
+
+    # Параметры хеширования поменялись - сохраняем пароль с новыми настройками
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
+
+    access_token = create_access_token(user.id, user.role)
     
     # Установка куки с токеном доступа и установка флага аутентификации вместе с ответом
     response = JSONResponse(content={"access_token": access_token, "token_type": "bearer"})
     response.set_cookie(key="access_token", value=access_token)  # Устанавливаем токен в куку
-    print(access_token)
     return response
 
 @app.post("/logout/",  tags=['registration'])
@@ -156,11 +320,13 @@ async def logout(request: Request, response: Response, token: str = Cookie(None)
 
 
 @app.delete("/users/{user_id}/" , tags=['registration'])
-async def delete_user(user_id: str, db: Session = Depends(get_db)):
-    user = db.query(DBUser).filter(DBUser.id == user_id).first()
+async def delete_user(user_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    user = await db.get(DBUser, user_id)
     if user:
-        db.delete(user)
-        db.commit()
+        await db.delete(user)
+        await db.commit()
+        # Роль берётся из токена и кешируется - без этого удалённый пользователь сохранил бы доступ
+        invalidate_user_tokens(str(user_id))
         return {"message": "User with ID {} has been deleted".format(user_id)}
     raise HTTPException(status_code=404, detail="User not found")
 
@@ -170,108 +336,299 @@ def has_token(request: Request) -> bool:
 
 
 #пост запрос для админа
-@app.post("/items/", response_model=Item)
-async def create_item(item_create: ItemCreate, db: Session = Depends(get_db)):
-    item_id = str(uuid.uuid4())
-    db_item = DBItem(id=item_id, **item_create.dict())
+@app.post("/items/", response_model=ItemOut)
+async def create_item(item_create: ItemCreate, db: AsyncSession = Depends(get_db)):
+    db_item = DBItem(**item_create.dict())
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
-    return db_item
+    await db.commit()
+    await db.refresh(db_item)
+    catalog_cache.bump()
+    refresh_images([db_item.image_url])
+    return item_to_dict(db_item)
 
 
-@app.put("/items/{item_id}", response_model=Item)
-async def update_item(item_id: str, item_update: ItemCreate, db: Session = Depends(get_db)):
-    db_item = db.query(DBItem).filter(DBItem.id == item_id).first()
+@app.put("/items/{item_id}", response_model=ItemOut)
+async def update_item(item_id: uuid.UUID, item_update: ItemCreate, db: AsyncSession = Depends(get_db)):
+    db_item = await db.get(DBItem, item_id)
     if db_item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     for field, value in item_update.dict(exclude_unset=True).items():
         setattr(db_item, field, value)
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
-    return db_item
+    await db.commit()
+    await db.refresh(db_item)
+    catalog_cache.bump()
+    refresh_images([db_item.image_url])
+    return item_to_dict(db_item)
 
 # Получение всех товаров
-@app.get("/items/", response_model=list[Item],  tags=['admin'])
-async def read_items(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    items = db.query(DBItem).offset(skip).limit(limit).all()
-    return items
+# Ответ собирается из запрошенных полей без response_model, поэтому форма описана в responses
+@app.get("/items/", response_model=None, tags=['admin'],
+         responses={200: {"model": list[ItemFields],
+                          "description": "Без fields= - поля ItemOut (без id), с fields= - только перечисленные. "
+                                         "Курсоры соседних страниц - в заголовках X-Next-Cursor и X-Prev-Cursor"}})
+async def read_items(request: Request, skip: int = 0, limit: int = Query(10, ge=1, le=100), cursor: Optional[str] = None,
+                     sort: str = Query('id', regex='^(id|price)$'), fields: Optional[str] = Query(None, description="Поля через запятую, например id,title,price,image_url"),
+                     db: AsyncSession = Depends(get_db)):
+    selected = parse_item_fields(fields, ITEM_OUT_FIELDS)
+    # Каталог не менялся - отвечаем 304 без запроса к базе (если остатки не запрошены)
+    version = catalog_cache.version
+    etag = make_etag(version, request.url.path, request.url.query)
+    cached = not_modified(request, etag, CATALOG_CACHE_CONTROL) if STOCK_FIELD not in selected else None
+    if cached:
+        return cached
+
+    items, next_cursor, prev_cursor = await load_catalog_page(db, version, skip, limit, cursor, sort, selected)
+    etag = stock_etag(etag, items, selected)
+    cached = not_modified(request, etag, CATALOG_CACHE_CONTROL)
+    if cached:
+        return cached
+    headers = cache_headers(etag, CATALOG_CACHE_CONTROL)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if prev_cursor:
+        headers["X-Prev-Cursor"] = prev_cursor
+    # Словари уже содержат ровно нужные поля - отдаём их без повторной проверки через response_model
+    return ORJSONResponse(items, headers=headers)
+
+
+# Поиск по каталогу: полнотекстовый запрос, диапазон цены и фасеты с количеством товаров
+@app.get("/items/search", tags=['client'])
+async def search_items(request: Request, response: Response, q: Optional[str] = None, price_min: Optional[int] = None, price_max: Optional[int] = None,
+                       pol: List[str] = Query([]), types: List[str] = Query([]), size: List[str] = Query([]),
+                       color: List[str] = Query([]), limit: int = Query(40, ge=1, le=100), cursor: Optional[str] = None,
+                       fields: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    selected = parse_item_fields(fields, ITEM_FIELDS)
+    version = catalog_cache.version
+    etag = make_etag(version, request.url.path, request.url.query)
+    cached = not_modified(request, etag, CATALOG_CACHE_CONTROL) if STOCK_FIELD not in selected else None
+    if cached:
+        return cached
+
+    facets = {"pol": pol, "types": types, "size": size, "color": color}
+    conditions = build_conditions(db.bind.dialect.name, q, price_min, price_max, facets)
+    filters = (q, price_min, price_max, tuple((field, tuple(sorted(values))) for field, values in facets.items()))
+    key = ('search', *filters, limit, cursor, selected)
+    cached_page = catalog_cache.get(version, key)
+    if cached_page is not None:
+        page, ids = cached_page
+        page = {**page, "items": await attach_stock(db, page["items"], ids, selected)}
+    else:
+        query = search_query(selected, conditions)
+        rows, next_cursor, prev_cursor = await keyset_page(db, query, ITEM_SORT_KEYS['id'], cursor, limit, scalars=False)
+        page = {"items": [item_row_to_dict(row._mapping, selected) for row in rows],
+                "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+        catalog_cache.set(version, key, (page, [row.id for row in rows]))
+
+    # Итог и фасеты не зависят от страницы: при листании результатов они считаются один раз
+    counts_key = ('search-counts', *filters)
+    counts = catalog_cache.get(version, counts_key)
+    if counts is None:
+        counts = await facet_counts(db, conditions)
+        catalog_cache.set(version, counts_key, counts)
+    total, facet_values = counts
+    page = {"items": page["items"], "total": total, "facets": facet_values,
+            "next_cursor": page["next_cursor"], "prev_cursor": page["prev_cursor"]}
+
+    etag = stock_etag(etag, page["items"], selected)
+    cached = not_modified(request, etag, CATALOG_CACHE_CONTROL)
+    if cached:
+        return cached
+    response.headers.update(cache_headers(etag, CATALOG_CACHE_CONTROL))
+    return page
+
+
+# Массовая загрузка товаров из CSV/NDJSON (пачками, с отчётом об ошибках по строкам)
+@app.post("/items/import", tags=['admin'])
+async def import_items_file(file: UploadFile = File(...), format: Optional[str] = Query(None, regex='^(csv|ndjson)$'),
+                            principal: Principal = Depends(require_role('admin')), db: AsyncSession = Depends(get_db)):
+    try:
+        report = await import_items(db, file.file, detect_format(file.filename, format),
+                                    on_batch=lambda rows: refresh_images(row["image_url"] for row in rows))
+    finally:
+        # Пачки коммитятся по отдельности, поэтому кеш сбрасываем даже при ошибке посередине
+        catalog_cache.bump()
+    return report
+
+
+# Выгрузка всех товаров потоком
+@app.get("/items/export", tags=['admin'])
+async def export_items_file(format: str = Query('ndjson', regex='^(csv|ndjson)$'),
+                            principal: Principal = Depends(require_role('admin')), db: AsyncSession = Depends(get_db)):
+    media_type = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(export_items(db, format), media_type=media_type,
+                             headers={"Content-Disposition": f"attachment; filename=items.{format}"})
+
+
+# Счётчики кеша каталога (для подбора его размера)
+@app.get("/items/cache-stats", tags=['admin'])
+async def catalog_cache_stats():
+    return catalog_cache.stats()
+
+
+# Получение одного товара
+@app.get("/items/{item_id}", response_model=ItemOut, tags=['client'])
+async def read_item(item_id: uuid.UUID, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    version = catalog_cache.version
+    item = catalog_cache.get(version, ('item', item_id))
+    if item is None:
+        db_item = await db.get(DBItem, item_id)
+        if db_item is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        item = item_to_dict(db_item)
+        catalog_cache.set(version, ('item', item_id), item)
+    else:
+        item = (await attach_stock(db, [item], [item["id"]], ITEM_FIELDS))[0]
+
+    etag = stock_etag(make_etag(version, request.url.path), [item], ITEM_FIELDS)
+    cached = not_modified(request, etag, CATALOG_CACHE_CONTROL)
+    if cached:
+        return cached
+    response.headers.update(cache_headers(etag, CATALOG_CACHE_CONTROL))
+    return item
+
+
+# Часто покупают вместе: готовый список соседей товара (см. recommend.py)
+@app.get("/items/{item_id}/related", response_model=None, tags=['client'],
+         responses={200: {"model": list[ItemFields],
+                          "description": "Без fields= - все поля товара, включая id и quantity, с fields= - только перечисленные"}})
+async def read_related_items(item_id: uuid.UUID, request: Request, limit: int = Query(RELATED_ITEMS_LIMIT, ge=1, le=RELATED_ITEMS_LIMIT),
+                             fields: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    selected = parse_item_fields(fields, ITEM_FIELDS)
+    version = catalog_cache.version
+    key = ('related', str(item_id), limit, selected)
+    cached_items = catalog_cache.get(version, key)
+    if cached_items is not None:
+        items, ids = cached_items
+        items = await attach_stock(db, items, ids, selected)
+    else:
+        rows = await related_items(db, item_id, item_columns(selected, [DBItem.id]), limit)
+        items, ids = [item_row_to_dict(row._mapping, selected) for row in rows], [row.id for row in rows]
+        catalog_cache.set(version, key, (items, ids))
+
+    # Список меняется заказами без смены версии каталога (см. checkout_cart), поэтому id входят в ETag
+    etag = stock_etag(make_etag(version, request.url.path, request.url.query, ids), items, selected)
+    cached = not_modified(request, etag, CATALOG_CACHE_CONTROL)
+    if cached:
+        return cached
+    return ORJSONResponse(items, headers=cache_headers(etag, CATALOG_CACHE_CONTROL))
 
 
 #удаление товара 
 @app.delete("/items/{item_id}",  tags=['client'])
-async def delete_item(item_id: str, db: Session = Depends(get_db)):
-    db_item = db.query(DBItem).filter(DBItem.id == item_id).first()
+async def delete_item(item_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+    db_item = await db.get(DBItem, item_id)
     if not db_item:
         raise HTTPException(status_code=404, detail="Item not found")
-    db.delete(db_item)
-    db.commit()
+    await db.delete(db_item)
+    await db.commit()
+    catalog_cache.bump()
     return {"message": "Item deleted"}
 
 
 
 
 @app.post("/add-to-cart",  tags=['client'])
-async def add_to_cart(cart_item: CartItemCreate, request: Request, access_token: str = Cookie(None), db: Session = Depends(get_db)):
-    if not access_token:
-        raise HTTPException(status_code=401, detail="Требуется авторизация")  # проверка наличия токена
-
-    user_id = get_user_id_from_access_token(access_token)  # Получаем айди пользователя из токена
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Неверный токен")
+async def add_to_cart(cart_item: CartItemCreate, request: Request, principal: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    if cart_item.quantity < 1:
+        raise HTTPException(status_code=422, detail="Количество должно быть больше нуля")
 
-    # Создание экземпляра CartItem и сохранение его в базе данных
-    new_cart_item = CartItem(user_id=user_id, item_id=cart_item.item_id, quantity=cart_item.quantity)
-    db.add(new_cart_item)
-    db.commit()
-    db.refresh(new_cart_item)
+    cart_item_id = await add_cart_item(db, principal.id, cart_item.item_id, cart_item.quantity)
 
-    return {"message": "Товар добавлен в корзину", "cart_item_id": new_cart_item.id}
+    return {"message": "Товар добавлен в корзину", "cart_item_id": cart_item_id}
 
 #гет запросы для фронтента
 
 @app.get("/", response_class=HTMLResponse, tags=['client'])
-async def index(request: Request, skip: int = 0, limit: int = 40, db: Session = Depends(get_db)):
-    items = db.query(DBItem).offset(skip).limit(limit).all()
-    return templates.TemplateResponse("index.html", {"request": request, "items": items,  "has_token": has_token(request)})
+async def index(request: Request, skip: int = 0, limit: int = Query(40, ge=1, le=100), cursor: Optional[str] = None,
+                sort: str = Query('id', regex='^(id|price)$'), principal: Optional[Principal] = Depends(get_optional_user),
+                db: AsyncSession = Depends(get_db)):
+    # Страница зависит от каталога, от того, вошёл ли пользователь, и от его избранного. В ETag идёт
+    # само множество избранного (из кеша favorite_ids): изменение через другой воркер меняет ETag,
+    # как только здесь истечёт FAVORITES_CACHE_TTL
+    favorites = await favorite_ids(db, principal.id) if principal else frozenset()
+    user_part = f"{principal.id}:{','.join(sorted(favorites))}" if principal else ''
+    version = catalog_cache.version
+    etag = make_etag(version, request.url.path, request.url.query, has_token(request), user_part)
+    cached = not_modified(request, etag, 'private, no-cache', vary='Cookie')
+    if cached:
+        return cached
+
+    items, next_cursor, prev_cursor = await load_catalog_page(db, version, skip, limit, cursor, sort, STOREFRONT_FIELDS)
+    return templates.TemplateResponse("index.html", {"request": request, "items": items,  "has_token": has_token(request),
+                                                     "favorites": favorites, "is_logged_in": principal is not None,
+                                                     "next_cursor": next_cursor, "prev_cursor": prev_cursor, "sort": sort},
+                                      headers=cache_headers(etag, 'private, no-cache', vary='Cookie'))
+
+# Избранное
+@app.get("/favorites", response_model=list[FavoriteOut], tags=['client'])
+async def read_favorites(principal: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    return [item_to_dict(item) for item in await list_favorites(db, principal.id)]
+
+
+@app.post("/favorites/{item_id}", tags=['client'])
+async def create_favorite(item_id: uuid.UUID, principal: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    if await db.get(DBItem, item_id) is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    await add_favorite(db, principal.id, item_id)
+    return {"message": "Товар добавлен в избранное"}
 
-@app.get("/cart", response_class=HTMLResponse, tags=['client'])
-async def view_cart(request: Request, access_token: str = Cookie(None), db: Session = Depends(get_db)):
-    if not access_token:
-        raise HTTPException(status_code=401, detail="Требуется авторизация")  # проверка наличия токена
 
-    user_id = get_user_id_from_access_token(access_token)  # Получаем айди пользователя из токена
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Неверный токен")
+@app.delete("/favorites/{item_id}", tags=['client'])
+async def delete_favorite(item_id: uuid.UUID, principal: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    if not await remove_favorite(db, principal.id, item_id):
+        raise HTTPException(status_code=404, detail="Товар не найден в избранном")
+    return {"message": "Товар удалён из избранного"}
 
+
+@app.get("/cart", response_class=HTMLResponse, tags=['client'])
+async def view_cart(request: Request, principal: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     # Запрос к базе данных для получения товаров в корзине по айди пользователя
-    cart_items = db.query(CartItem).filter_by(user_id=user_id).all()
+    cart_items, total = await load_cart(db, principal.id)
 
     # Возвращаем шаблон HTML с информацией о товарах в корзине
-    return templates.TemplateResponse("cart.html", {"request": request, "cart_items": cart_items})
+    return templates.TemplateResponse("cart.html", {"request": request, "cart_items": cart_items, "total": total})
 
 
-@app.delete("/cart/{item_id}" , tags=['client'])
-async def remove_from_cart(item_id: str, request: Request, access_token: str = Cookie(None), db: Session = Depends(get_db)):
-    if not access_token:
-        raise HTTPException(status_code=401, detail="Требуется авторизация")  # проверка наличия токена
+@app.get("/cart/summary", tags=['client'])
+async def cart_summary(principal: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    cart_items, total = await load_cart(db, principal.id)
+    lines = [{"item_id": line["item"].id, "title": line["item"].title, "price": line["item"].price,
+              "quantity": line["quantity"], "line_total": line["line_total"]} for line in cart_items]
+    return {"items": lines, "count": sum(line["quantity"] for line in lines), "total": total}
+
 
-    user_id = get_user_id_from_access_token(access_token)  # Получаем айди пользователя из токена
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Неверный токен")
+@app.delete("/cart/{item_id}" , tags=['client'])
+async def remove_from_cart(item_id: uuid.UUID, request: Request, principal: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    user_id = principal.id
 
     # Проверяем, есть ли такой товар в корзине
-    cart_item = db.query(CartItem).filter_by(user_id=user_id, item_id=item_id).first()
+    result = await db.execute(select(CartItem).filter_by(user_id=user_id, item_id=item_id))
+    cart_item = result.scalars().first()
     if not cart_item:
         raise HTTPException(status_code=404, detail="Товар не найден в корзине")
 
     # Удаляем товар из корзины
-    db.delete(cart_item)
-    db.commit()
+    await db.delete(cart_item)
+    await db.commit()
 
     return {"message": "Товар успешно удален из корзины"}
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics():
+    return metrics.render()
+
+
+# Оформление заказа: корзина превращается в продажи, остатки списываются атомарно
+@app.post("/checkout", tags=['client'])
+async def checkout_cart(principal: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    order = await checkout(db, principal.id)
+    changed = await record_purchases(db, principal.id, [line["item_id"] for line in order["items"]])
+    # Версию каталога не меняем: остатки читаются заново при каждом ответе, а из кеша убираем
+    # только рекомендации товаров, чьи списки пересчитаны (другие воркеры обновят их по TTL)
+    catalog_cache.discard(lambda key: key[0] == 'related' and key[1] in changed)
+    return order
+
 @app.get("/users/", response_class=HTMLResponse, tags=['front(reg)'])
 async def reg(request: Request):
     return templates.TemplateResponse("reg.html", {"request": request})
@@ -284,14 +641,13 @@ async def login(request: Request):
 
 
 @app.get("/profil/", response_class=HTMLResponse, tags=['client'])
-async def profil(request: Request, access_token: str = Cookie(None), db: Session = Depends(get_db)):
+async def profil(request: Request, principal: Optional[Principal] = Depends(get_optional_user), db: AsyncSession = Depends(get_db)):
     has_token = False
     user = None
 
-    if access_token:
+    if principal:
         has_token = True
-        user_id = get_user_id_from_access_token(access_token)  # Получаем айди пользователя из токена
-        user = db.query(DBUser).filter(DBUser.id == user_id).first()  # Получаем пользователя по айди из токена
+        user = await db.get(DBUser, principal.id)  # Получаем пользователя по айди из токена
 
     return templates.TemplateResponse("profil.html", {"request": request, "has_token": has_token, "user": user})
 
@@ -0,0 +1,175 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Callable, Optional
+from sqlalchemy import event
+import logging
+import time
+
+logger = logging.getLogger("shop.slow_requests")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Сколько SQL-запросов сохранять для журнала медленных запросов
+MAX_LOGGED_STATEMENTS = 20
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя ячейка - +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# Статистика одного HTTP-запроса, заполняется обработчиками событий SQLAlchemy
+class RequestStats:
+    __slots__ = ('queries', 'query_time', 'statements')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.statements = []
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar('current_request', default=None)
+
+
+class Metrics:
+    def __init__(self, slow_request_ms: float = 0):
+        self.slow_request_ms = slow_request_ms
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+        self.query_time = defaultdict(float)
+        self.responses = defaultdict(int)
+        self.gauges = {}
+
+    def register_gauge(self, name: str, help_text: str, read: Callable[[], dict]):
+        """Дополнительные метрики; read() возвращает {кортеж пар меток: значение}."""
+        self.gauges[name] = (help_text, read)
+
+    def instrument_engine(self, sync_engine):
+        event.listen(sync_engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(sync_engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        stats = current_request.get()
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.query_time += elapsed
+        if self.slow_request_ms and len(stats.statements) < MAX_LOGGED_STATEMENTS:
+            stats.statements.append((elapsed, statement))
+
+    def record(self, method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        self.latency[(method, route)].observe(elapsed)
+        self.queries[(method, route)].observe(stats.queries)
+        self.query_time[(method, route)] += stats.query_time
+        self.responses[(method, route, status)] += 1
+
+        if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+            statements = '\n'.join(f"  {duration * 1000:.1f} ms: {statement}" for duration, statement in stats.statements)
+            logger.warning("Медленный запрос %s %s: %.1f ms, %d SQL (%.1f ms)\n%s", method, route, elapsed * 1000,
+                           stats.queries, stats.query_time * 1000, statements)
+
+    def render(self) -> str:
+        # Текстовый формат Prometheus
+        lines = [
+            '# HELP http_request_duration_seconds Время обработки запроса',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        lines += self._render_histograms('http_request_duration_seconds', self.latency)
+        lines += [
+            '# HELP http_request_db_queries Количество SQL-запросов на один HTTP-запрос',
+            '# TYPE http_request_db_queries histogram',
+        ]
+        lines += self._render_histograms('http_request_db_queries', self.queries)
+        lines += [
+            '# HELP http_request_db_seconds_total Суммарное время SQL-запросов',
+            '# TYPE http_request_db_seconds_total counter',
+        ]
+        for (method, route), value in self.query_time.items():
+            lines.append(f'http_request_db_seconds_total{{method="{method}",route="{route}"}} {value}')
+        lines += [
+            '# HELP http_responses_total Ответы по статусам',
+            '# TYPE http_responses_total counter',
+        ]
+        for (method, route, status), value in self.responses.items():
+            lines.append(f'http_responses_total{{method="{method}",route="{route}",status="{status}"}} {value}')
+        for name, (help_text, read) in self.gauges.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            for labels, value in read().items():
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histograms(name: str, histograms: dict) -> list:
+        lines = []
+        for (method, route), histogram in histograms.items():
+            labels = f'method="{method}",route="{route}"'
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return lines
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время ответа, статус и число SQL-запросов по шаблону маршрута."""
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+        self._route_paths = {}
+
+    def route_label(self, scope) -> str:
+        # Router записывает найденный endpoint в scope; метка - шаблон пути, а не сам путь,
+        # чтобы /items/123 и /items/456 попадали в одну серию
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return 'unmatched'
+        label = self._route_paths.get(id(endpoint))
+        if label is None:
+            label = 'unmatched'
+            for route in scope['app'].routes:
+                if getattr(route, 'endpoint', None) is endpoint or getattr(route, 'app', None) is endpoint:
+                    label = route.path
+                    break
+            self._route_paths[id(endpoint)] = label
+        return label
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            self.metrics.record(scope['method'], self.route_label(scope), status, elapsed, stats)
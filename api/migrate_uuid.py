@@ -0,0 +1,120 @@
+"""Перевод id пользователей и товаров из текстовых колонок в нативный uuid (PostgreSQL).
+
+Данные копируются в новые колонки небольшими пачками (каждая пачка - отдельная короткая
+транзакция, без долгих блокировок таблиц), затем колонки меняются местами одной транзакцией.
+Существующие значения (uuid4 в виде текста) сохраняются, новые строки получают uuid7.
+
+    python migrate_uuid.py [--batch-size 5000]
+"""
+from sqlalchemy import text
+from database import engine
+import argparse
+
+# Таблица -> колонки, которые нужно перевести в uuid
+COLUMNS = {
+    'users': ['id'],
+    'items': ['id'],
+    'cart': ['user_id', 'item_id'],
+    'favorites': ['user_id', 'item_id'],
+    'sales': ['user_id', 'item_id'],
+}
+
+# Внешние ключи, которые пересоздаются после замены колонок
+FOREIGN_KEYS = [
+    ('cart', 'user_id', 'users'), ('cart', 'item_id', 'items'),
+    ('favorites', 'user_id', 'users'), ('favorites', 'item_id', 'items'),
+    ('sales', 'user_id', 'users'), ('sales', 'item_id', 'items'),
+]
+
+
+def column_type(conn, table: str, column: str) -> str:
+    return conn.execute(text(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = :table AND column_name = :column"
+    ), {"table": table, "column": column}).scalar()
+
+
+def copy_in_batches(table: str, column: str, batch_size: int):
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column}_uuid uuid"))
+
+    # Таблица обходится по первичному ключу: каждая пачка - диапазон индекса после прошлой,
+    # без повторного поиска ещё не скопированных строк по всей таблице
+    copied = 0
+    last_id = None
+    while True:
+        after = "" if last_id is None else "WHERE id > :last_id"
+        with engine.begin() as conn:
+            upper_id = conn.execute(text(
+                f"SELECT max(id) FROM (SELECT id FROM {table} {after} ORDER BY id LIMIT :limit) batch"
+            ), {"last_id": last_id, "limit": batch_size}).scalar()
+            if upper_id is None:
+                break
+            lower = "" if last_id is None else "id > :last_id AND"
+            result = conn.execute(text(
+                f"UPDATE {table} SET {column}_uuid = {column}::uuid "
+                f"WHERE {lower} id <= :upper_id AND {column} IS NOT NULL"
+            ), {"last_id": last_id, "upper_id": upper_id})
+        copied += result.rowcount
+        last_id = upper_id
+    print(f"{table}.{column}: скопировано {copied}")
+
+
+def swap_columns():
+    # Одна транзакция: между копированием и заменой могли появиться новые строки - докопируем их
+    with engine.begin() as conn:
+        # Индексы на заменяемых колонках удалятся вместе с ними; запоминаем их определения,
+        # после переименования колонок те же определения снова подходят
+        index_definitions = conn.execute(text(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() "
+            "AND tablename = ANY(:tables) AND indexname NOT LIKE '%_pkey'"
+        ), {"tables": list(COLUMNS)}).scalars().all()
+
+        for table, column, _ in FOREIGN_KEYS:
+            conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_{column}_fkey"))
+
+        for table, columns in COLUMNS.items():
+            conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+            for column in columns:
+                conn.execute(text(f"UPDATE {table} SET {column}_uuid = {column}::uuid "
+                                  f"WHERE {column}_uuid IS NULL AND {column} IS NOT NULL"))
+
+        for table in ('users', 'items'):
+            conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_pkey"))
+
+        for table, columns in COLUMNS.items():
+            for column in columns:
+                conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+                conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN {column}_uuid TO {column}"))
+
+        for table in ('users', 'items'):
+            conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id)"))
+        for table, column, target in FOREIGN_KEYS:
+            conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey "
+                              f"FOREIGN KEY ({column}) REFERENCES {target} (id)"))
+        for definition in index_definitions:
+            conn.execute(text(definition.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1)
+                              .replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX IF NOT EXISTS', 1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    if engine.dialect.name != 'postgresql':
+        raise SystemExit("Миграция нужна только для PostgreSQL")
+
+    with engine.connect() as conn:
+        if column_type(conn, 'users', 'id') == 'uuid':
+            print("Колонки уже в формате uuid")
+            return
+
+    for table, columns in COLUMNS.items():
+        for column in columns:
+            copy_in_batches(table, column, args.batch_size)
+    swap_columns()
+    print("Готово")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine
+from config import URL_DATABASE
+from database import GUID, Base
+import models  # noqa: F401 - регистрирует таблицы в Base.metadata
+
+if context.config.config_file_name is not None:
+    fileConfig(context.config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # Полнотекстовые объекты создаются SQL-командами в миграциях, в моделях их нет
+    if type_ == 'table' and name.startswith('items_fts'):
+        return False
+    if type_ == 'index' and name == 'ix_items_search':
+        return False
+    return True
+
+
+def compare_type(context, inspected_column, metadata_column, inspected_type, metadata_type):
+    # Вне PostgreSQL GUID хранится в строковой колонке - это не расхождение схемы
+    if isinstance(metadata_type, GUID) and context.dialect.name != 'postgresql':
+        return False
+    return None
+
+
+def run_migrations_offline():
+    context.configure(url=URL_DATABASE, target_metadata=target_metadata, literal_binds=True,
+                      include_object=include_object, compare_type=compare_type)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = create_engine(URL_DATABASE)
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object,
+                          compare_type=compare_type)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,78 @@
+"""Исходная схема (как её создавал Base.metadata.create_all)
+
+Для уже работающей базы миграцию не выполняют, а только отмечают:
+    alembic stamp 0001_baseline
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('username', sa.String()),
+        sa.Column('password', sa.String()),
+        sa.Column('email', sa.String()),
+        sa.Column('role', sa.String()),
+    )
+    op.create_index('ix_users_id', 'users', ['id'])
+    op.create_index('ix_users_username', 'users', ['username'], unique=True)
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+
+    op.create_table(
+        'items',
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('title', sa.String()),
+        sa.Column('pol', sa.String()),
+        sa.Column('types', sa.String()),
+        sa.Column('description', sa.String()),
+        sa.Column('price', sa.Integer()),
+        sa.Column('size', sa.String()),
+        sa.Column('color', sa.String()),
+        sa.Column('image_url', sa.String()),
+        sa.Column('quantity', sa.Integer()),
+    )
+    for column in ('id', 'title', 'pol', 'types', 'description'):
+        op.create_index(f'ix_items_{column}', 'items', [column])
+
+    op.create_table(
+        'favorites',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id')),
+        sa.Column('item_id', sa.String(), sa.ForeignKey('items.id')),
+    )
+    op.create_index('ix_favorites_id', 'favorites', ['id'])
+
+    op.create_table(
+        'cart',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id')),
+        sa.Column('item_id', sa.String(), sa.ForeignKey('items.id')),
+        sa.Column('quantity', sa.Integer()),
+    )
+    op.create_index('ix_cart_id', 'cart', ['id'])
+
+    op.create_table(
+        'sales',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id')),
+        sa.Column('item_id', sa.String(), sa.ForeignKey('items.id')),
+        sa.Column('quantity', sa.Integer()),
+        sa.Column('total_amount', sa.Integer()),
+    )
+    op.create_index('ix_sales_id', 'sales', ['id'])
+
+
+def downgrade():
+    for table in ('sales', 'cart', 'favorites', 'items', 'users'):
+        op.drop_table(table)
@@ -0,0 +1,66 @@
+"""Индексы каталога, поиска, корзины и избранного
+
+Перед уникальными индексами повторяющиеся строки корзины сливаются (количество
+складывается), а повторы в избранном удаляются. В PostgreSQL индексы строятся
+CONCURRENTLY, чтобы не блокировать запись в таблицы.
+
+Revision ID: 0002_catalog_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-18
+"""
+from alembic import op
+from models import ITEM_SEARCH_VECTOR, ITEM_FTS_SQLITE_DDL
+
+revision = '0002_catalog_indexes'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_items_price_id', 'items', ['price', 'id'], False),
+    ('ix_items_pol_types_price', 'items', ['pol', 'types', 'price'], False),
+    ('ux_cart_user_item', 'cart', ['user_id', 'item_id'], True),
+    ('ux_favorites_user_item', 'favorites', ['user_id', 'item_id'], True),
+]
+
+
+def is_postgres() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade():
+    op.execute(
+        "UPDATE cart SET quantity = (SELECT sum(c2.quantity) FROM cart c2 "
+        "WHERE c2.user_id = cart.user_id AND c2.item_id = cart.item_id) "
+        "WHERE id IN (SELECT min(id) FROM cart GROUP BY user_id, item_id HAVING count(*) > 1)"
+    )
+    op.execute("DELETE FROM cart WHERE id NOT IN (SELECT min(id) FROM cart GROUP BY user_id, item_id)")
+    op.execute("DELETE FROM favorites WHERE id NOT IN (SELECT min(id) FROM favorites GROUP BY user_id, item_id)")
+
+    op.drop_index('ix_items_description', 'items')
+    op.drop_index('ix_items_pol', 'items')
+
+    if is_postgres():
+        with op.get_context().autocommit_block():
+            for name, table, columns, unique in INDEXES:
+                op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True, if_not_exists=True)
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_items_search ON items USING gin ({ITEM_SEARCH_VECTOR})")
+    else:
+        for name, table, columns, unique in INDEXES:
+            op.create_index(name, table, columns, unique=unique, if_not_exists=True)
+        for statement in ITEM_FTS_SQLITE_DDL:
+            op.execute(statement)
+        op.execute("INSERT INTO items_fts(items_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if is_postgres():
+        op.execute("DROP INDEX IF EXISTS ix_items_search")
+    else:
+        for trigger in ('items_fts_ai', 'items_fts_ad', 'items_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS items_fts")
+    for name, table, _, _ in INDEXES:
+        op.drop_index(name, table)
+    op.create_index('ix_items_pol', 'items', ['pol'])
+    op.create_index('ix_items_description', 'items', ['description'])
@@ -0,0 +1,63 @@
+"""Ключи пользователей и товаров в формате uuid
+
+Миграция переписывает таблицы целиком одной транзакцией. Для большой базы сначала
+выполните python migrate_uuid.py (копирование пачками) - тогда здесь ничего делать не придётся.
+
+Revision ID: 0003_uuid_keys
+Revises: 0002_catalog_indexes
+Create Date: 2026-10-18
+"""
+from alembic import op
+from sqlalchemy import text
+
+revision = '0003_uuid_keys'
+down_revision = '0002_catalog_indexes'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ('users', 'id'), ('items', 'id'),
+    ('cart', 'user_id'), ('cart', 'item_id'),
+    ('favorites', 'user_id'), ('favorites', 'item_id'),
+    ('sales', 'user_id'), ('sales', 'item_id'),
+]
+
+FOREIGN_KEYS = [
+    ('cart', 'user_id', 'users'), ('cart', 'item_id', 'items'),
+    ('favorites', 'user_id', 'users'), ('favorites', 'item_id', 'items'),
+    ('sales', 'user_id', 'users'), ('sales', 'item_id', 'items'),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # SQLite: тип колонки не меняется, GUID хранит 32 hex-символа без дефисов
+        for table, column in COLUMNS:
+            op.execute(f"UPDATE {table} SET {column} = lower(replace({column}, '-', '')) WHERE {column} LIKE '%-%'")
+        return
+
+    data_type = bind.execute(text(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = 'users' AND column_name = 'id'"
+    )).scalar()
+    if data_type == 'uuid':
+        return  # уже переведено через migrate_uuid.py
+
+    for table, column, _ in FOREIGN_KEYS:
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_{column}_fkey")
+    for table, column in COLUMNS:
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE uuid USING {column}::uuid")
+    for table, column, target in FOREIGN_KEYS:
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey FOREIGN KEY ({column}) REFERENCES {target} (id)")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    for table, column, _ in FOREIGN_KEYS:
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_{column}_fkey")
+    for table, column in COLUMNS:
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE varchar USING {column}::text")
+    for table, column, target in FOREIGN_KEYS:
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey FOREIGN KEY ({column}) REFERENCES {target} (id)")
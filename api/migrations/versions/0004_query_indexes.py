@@ -0,0 +1,53 @@
+"""Индексы под реальные запросы
+
+Удаляются индексы, которые ничего не дают: дубли первичных ключей (ix_*_id) и индекс
+по title (поиск по названию идёт через полнотекстовый индекс). Добавляются индексы для
+продаж пользователя и для внешних ключей на items - без них удаление товара
+просматривает cart, favorites и sales целиком.
+
+Revision ID: 0004_query_indexes
+Revises: 0003_uuid_keys
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0004_query_indexes'
+down_revision = '0003_uuid_keys'
+branch_labels = None
+depends_on = None
+
+DROPPED = [
+    ('ix_users_id', 'users', ['id']),
+    ('ix_items_id', 'items', ['id']),
+    ('ix_items_title', 'items', ['title']),
+    ('ix_cart_id', 'cart', ['id']),
+    ('ix_favorites_id', 'favorites', ['id']),
+    ('ix_sales_id', 'sales', ['id']),
+]
+
+CREATED = [
+    ('ix_sales_user_id', 'sales', ['user_id']),
+    ('ix_sales_item_id', 'sales', ['item_id']),
+    ('ix_cart_item_id', 'cart', ['item_id']),
+    ('ix_favorites_item_id', 'favorites', ['item_id']),
+]
+
+
+def upgrade():
+    for name, table, _ in DROPPED:
+        op.drop_index(name, table, if_exists=True)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in CREATED:
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table, columns in CREATED:
+            op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in CREATED:
+        op.drop_index(name, table)
+    for name, table, columns in DROPPED:
+        op.create_index(name, table, columns)
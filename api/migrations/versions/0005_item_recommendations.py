@@ -0,0 +1,37 @@
+"""Таблицы рекомендаций "часто покупают вместе"
+
+Заполнить по уже накопленным продажам: python recommend.py rebuild
+
+Revision ID: 0005_item_recommendations
+Revises: 0004_query_indexes
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from database import GUID
+
+revision = '0005_item_recommendations'
+down_revision = '0004_query_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'item_pairs',
+        sa.Column('item_id', GUID(), sa.ForeignKey('items.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('other_id', GUID(), sa.ForeignKey('items.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        'item_related',
+        sa.Column('item_id', GUID(), sa.ForeignKey('items.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('rank', sa.Integer(), primary_key=True),
+        sa.Column('related_id', GUID(), sa.ForeignKey('items.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('score', sa.Integer(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('item_related')
+    op.drop_table('item_pairs')
@@ -1,13 +1,12 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, DDL, event
 from sqlalchemy.orm import relationship
-from database import Base
-import uuid
+from database import Base, GUID, uuid7
 
 # Модель пользователя
 class User(Base):
     __tablename__ = 'users'
 
-    id = Column(String, primary_key=True, index=True, default=str(uuid.uuid4()))
+    id = Column(GUID, primary_key=True, default=uuid7)
     username = Column(String, unique=True, index=True)
     password = Column(String)
     email = Column(String, unique=True, index=True)
@@ -21,28 +20,62 @@ class User(Base):
 class Item(Base):
     __tablename__ = 'items'
 
-    id = Column(String, primary_key=True, index=True, default=str(uuid.uuid4()))
-    title = Column(String, index=True)
-    pol = Column(String, index=True)
+    id = Column(GUID, primary_key=True, default=uuid7)
+    title = Column(String)
+    pol = Column(String)
     types = Column(String, index=True)
-    description = Column(String, index=True)
+    description = Column(String)
     price = Column(Integer)
     size = Column(String)
     color = Column(String)
     image_url = Column(String)
     quantity = Column(Integer, default=1)
 
+    __table_args__ = (
+        # Индекс под keyset-пагинацию каталога с сортировкой по цене
+        Index('ix_items_price_id', 'price', 'id'),
+        # Фильтр по полу и типу с диапазоном цены (основной сценарий поиска)
+        Index('ix_items_pol_types_price', 'pol', 'types', 'price'),
+    )
+
     favorites = relationship("FavoriteItem", back_populates="item")
     cart = relationship("CartItem", back_populates="item")
     sales = relationship("Sale", back_populates="item")
 
+# Полнотекстовый поиск по названию и описанию.
+# В PostgreSQL - GIN-индекс по выражению; запросы должны использовать то же самое выражение
+ITEM_SEARCH_VECTOR = "to_tsvector('russian', coalesce(title, '') || ' ' || coalesce(description, ''))"
+
+event.listen(Item.__table__, 'after_create', DDL(
+    f"CREATE INDEX IF NOT EXISTS ix_items_search ON items USING gin ({ITEM_SEARCH_VECTOR})"
+).execute_if(dialect='postgresql'))
+
+# В SQLite (локальные прогоны) - таблица FTS5, которую синхронизируют триггеры
+ITEM_FTS_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(title, description, content='items', content_rowid='rowid')",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN "
+    "INSERT INTO items_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN "
+    "INSERT INTO items_fts(items_fts, rowid, title, description) VALUES ('delete', old.rowid, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE ON items BEGIN "
+    "INSERT INTO items_fts(items_fts, rowid, title, description) VALUES ('delete', old.rowid, old.title, old.description); "
+    "INSERT INTO items_fts(rowid, title, description) VALUES (new.rowid, new.title, new.description); END",
+]
+for statement in ITEM_FTS_SQLITE_DDL:
+    event.listen(Item.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
 # Модель товара в избранном пользователя
 class FavoriteItem(Base):
     __tablename__ = 'favorites'
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, ForeignKey('users.id'))
-    item_id = Column(String, ForeignKey('items.id'))
+    id = Column(Integer, primary_key=True)
+    user_id = Column(GUID, ForeignKey('users.id'))
+    item_id = Column(GUID, ForeignKey('items.id'), index=True)
+
+    # Уникальный индекс заодно обслуживает выборки избранного по user_id
+    __table_args__ = (
+        Index('ux_favorites_user_item', 'user_id', 'item_id', unique=True),
+    )
 
     user = relationship("User", back_populates="favorites")
     item = relationship("Item", back_populates="favorites")
@@ -51,11 +84,17 @@ class FavoriteItem(Base):
 class CartItem(Base):
     __tablename__ = 'cart'
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, ForeignKey('users.id'))
-    item_id = Column(String, ForeignKey('items.id'))
+    id = Column(Integer, primary_key=True)
+    user_id = Column(GUID, ForeignKey('users.id'))
+    item_id = Column(GUID, ForeignKey('items.id'), index=True)
     quantity = Column(Integer, default=1)
 
+    # Одна строка на товар в корзине; повторное добавление увеличивает количество.
+    # Индекс начинается с user_id, поэтому отдельный индекс для корзины пользователя не нужен
+    __table_args__ = (
+        Index('ux_cart_user_item', 'user_id', 'item_id', unique=True),
+    )
+
     user = relationship("User", back_populates="cart")
     item = relationship("Item", back_populates="cart")
 
@@ -63,11 +102,29 @@ class CartItem(Base):
 class Sale(Base):
     __tablename__ = 'sales'
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, ForeignKey('users.id'))
-    item_id = Column(String, ForeignKey('items.id'))
+    id = Column(Integer, primary_key=True)
+    user_id = Column(GUID, ForeignKey('users.id'), index=True)
+    item_id = Column(GUID, ForeignKey('items.id'), index=True)
     quantity = Column(Integer)
     total_amount = Column(Integer)
 
     buyer = relationship("User", back_populates="sales")
     item = relationship("Item", back_populates="sales")
+
+# Разреженная матрица совместных покупок: сколько покупателей купили оба товара.
+# Хранятся обе пары (a, b) и (b, a), поэтому строки товара читаются по первичному ключу
+class ItemPair(Base):
+    __tablename__ = 'item_pairs'
+
+    item_id = Column(GUID, ForeignKey('items.id', ondelete='CASCADE'), primary_key=True)
+    other_id = Column(GUID, ForeignKey('items.id', ondelete='CASCADE'), primary_key=True)
+    count = Column(Integer, nullable=False)
+
+# Готовые рекомендации "часто покупают вместе": top-N соседей товара по матрице item_pairs
+class RelatedItem(Base):
+    __tablename__ = 'item_related'
+
+    item_id = Column(GUID, ForeignKey('items.id', ondelete='CASCADE'), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    related_id = Column(GUID, ForeignKey('items.id', ondelete='CASCADE'), nullable=False)
+    score = Column(Integer, nullable=False)
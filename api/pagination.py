@@ -0,0 +1,104 @@
+from fastapi import HTTPException
+from sqlalchemy import tuple_, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from database import GUID
+import base64
+import json
+import uuid
+
+
+# Курсор - это значения ключа сортировки последней (или первой) строки страницы.
+# Клиент получает его в закодированном виде и передаёт обратно как есть
+def encode_cursor(values: list, direction: str = 'next') -> str:
+    raw = json.dumps({"d": direction, "v": values}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[str, list]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        direction, values = data["d"], data["v"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+    return direction, values
+
+
+def cursor_value(column, value):
+    # Значения курсора приходят от клиента: проверяем и приводим их к типу колонки до запроса,
+    # иначе неверное значение упадёт уже в драйвере базы с ошибкой 500
+    python_type = str if isinstance(column.type, GUID) else column.type.python_type
+    if isinstance(value, bool) or not isinstance(value, python_type):
+        raise TypeError(f"{column.key}: ожидается {python_type.__name__}")
+    if isinstance(column.type, GUID):
+        return uuid.UUID(value)  # ValueError, если строка не в формате uuid
+    return value
+
+
+def keyset_query(query, key_columns: list, cursor: Optional[str], limit: int):
+    """Запрос страницы после курсора; возвращает (запрос, направление, значения курсора или None).
+
+    key_columns должны задавать уникальный порядок (последней колонкой идёт первичный ключ),
+    а по ним должен существовать индекс - тогда любая страница читается за один index range scan.
+    """
+    direction, values = decode_cursor(cursor) if cursor else ('next', None)
+    if values is not None:
+        if len(values) != len(key_columns):
+            raise HTTPException(status_code=400, detail="Неверный курсор")
+        try:
+            values = [cursor_value(column, value) for column, value in zip(key_columns, values)]
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Неверный курсор")
+
+    key = tuple_(*key_columns)
+    if values is not None:
+        # Значения курсора привязываем с типами колонок (например, GUID хранит id не как строку)
+        bound = tuple_(*[literal(value, type_=column.type) for column, value in zip(key_columns, values)])
+    if direction == 'next':
+        if values is not None:
+            query = query.filter(key > bound)
+        query = query.order_by(*[column.asc() for column in key_columns])
+    else:
+        query = query.filter(key < bound)
+        query = query.order_by(*[column.desc() for column in key_columns])
+    # Берём на одну строку больше, чтобы узнать, есть ли следующая страница
+    return query.limit(limit + 1), direction, values
+
+
+async def keyset_page(db: AsyncSession, query, key_columns: list, cursor: Optional[str], limit: int, scalars: bool = True):
+    """Возвращает (строки, курсор следующей страницы, курсор предыдущей страницы).
+
+    Для запросов с выборкой отдельных колонок передаётся scalars=False - тогда возвращаются строки Row.
+    """
+    query, direction, values = keyset_query(query, key_columns, cursor, limit)
+    result = await db.execute(query)
+    rows = result.scalars().all() if scalars else result.all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'prev':
+        rows.reverse()
+
+    def key_of(row):
+        return [getattr(row, column.key) for column in key_columns]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if direction == 'prev' or has_more:
+            next_cursor = encode_cursor(key_of(rows[-1]), 'next')
+        if values is not None and (direction == 'next' or has_more):
+            prev_cursor = encode_cursor(key_of(rows[0]), 'prev')
+    return rows, next_cursor, prev_cursor
+
+
+async def iterate_keyset(db: AsyncSession, query, key_columns: list, batch_size: int, scalars: bool = True):
+    # Обход всей выборки пачками: в памяти одновременно не больше batch_size строк
+    cursor = None
+    while True:
+        rows, cursor, _ = await keyset_page(db, query, key_columns, cursor, batch_size, scalars=scalars)
+        for row in rows:
+            yield row
+        if not cursor:
+            break
@@ -0,0 +1,149 @@
+from collections import OrderedDict
+from fastapi import HTTPException, Request
+from typing import Optional
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    # "5/60" - пять попыток за 60 секунд (столько же помещается в ведро)
+    count, seconds = rate.split('/')
+    return int(count), float(seconds)
+
+
+def take_token(tokens: float, updated: float, capacity: int, refill_rate: float, now: float) -> tuple[float, float]:
+    """Пополняет ведро за прошедшее время и забирает один токен.
+
+    Возвращает (остаток токенов, сколько секунд ждать); 0 секунд - запрос пропускаем.
+    """
+    tokens = min(capacity, tokens + (now - updated) * refill_rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / refill_rate
+
+
+# Вёдра в памяти процесса. Ключей ограниченное число: при переполнении вытесняются давно
+# не использованные - полное ведро и отсутствующее ведро означают одно и то же
+class MemoryBucketStore:
+    blocking = False
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str, capacity: int, refill_rate: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens, wait = take_token(tokens, updated, capacity, refill_rate, now)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# Общие для всех воркеров вёдра в файле SQLite (для одной машины; для нескольких
+# понадобится хранилище с тем же методом take, например Redis)
+class SQLiteBucketStore:
+    blocking = True
+
+    # Полные вёдра удаляются не чаще раза в prune_interval секунд, а не на каждой попытке
+    def __init__(self, path: str, prune_interval: float = 60):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS rate_buckets ("
+                         "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, expires REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_buckets_expires ON rate_buckets (expires)")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, capacity: int, refill_rate: float) -> float:
+        # Время общее для процессов, поэтому time.time(), а не monotonic
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens, wait = take_token(tokens, updated, capacity, refill_rate, now)
+            # expires - момент, когда ведро снова станет полным и запись можно удалить
+            conn.execute("INSERT INTO rate_buckets (key, tokens, updated, expires) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, "
+                         "expires = excluded.expires",
+                         (key, tokens, now, now + (capacity - tokens) / refill_rate))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if now >= self._next_prune:
+            self._next_prune = now + self.prune_interval
+            self.prune(now)
+        return wait
+
+    def prune(self, now: Optional[float] = None) -> int:
+        # Диапазон по индексу на expires: читаются только записи, которые пора удалить
+        result = self._connection().execute("DELETE FROM rate_buckets WHERE expires < ?", (time.time() if now is None else now,))
+        return result.rowcount
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT count(*) FROM rate_buckets").fetchone()[0]
+
+
+class RateLimiter:
+    """Token bucket: capacity попыток подряд, дальше по одной каждые per_seconds / capacity секунд."""
+
+    def __init__(self, name: str, rate: str, store):
+        self.name = name
+        self.capacity, per_seconds = parse_rate(rate)
+        self.refill_rate = self.capacity / per_seconds
+        self.store = store
+        self.allowed = 0
+        self.rejected = 0
+
+    async def check(self, key: Optional[str]) -> None:
+        if not key:
+            return
+        bucket = f"{self.name}:{key}"
+        if self.store.blocking:
+            wait = await asyncio.get_running_loop().run_in_executor(
+                None, self.store.take, bucket, self.capacity, self.refill_rate)
+        else:
+            wait = self.store.take(bucket, self.capacity, self.refill_rate)
+        if wait:
+            self.rejected += 1
+            raise HTTPException(status_code=429, detail="Слишком много попыток, попробуйте позже",
+                                headers={"Retry-After": str(max(1, math.ceil(wait)))})
+        self.allowed += 1
+
+    def stats(self) -> dict:
+        return {"allowed": self.allowed, "rejected": self.rejected}
+
+
+def client_ip(request: Request, proxy_hops: int = 0) -> Optional[str]:
+    """Адрес клиента для ограничителя.
+
+    Каждый прокси дописывает в X-Forwarded-For адрес, от которого получил запрос, поэтому
+    доверять можно только proxy_hops последним записям: всё левее клиент мог подставить сам.
+    """
+    peer = request.client.host if request.client else None
+    if proxy_hops <= 0:
+        return peer
+    forwarded = [address.strip() for address in request.headers.get('x-forwarded-for', '').split(',') if address.strip()]
+    if len(forwarded) < proxy_hops:
+        # Запрос пришёл в обход части прокси - считаем его по адресу соединения
+        return peer
+    return forwarded[-proxy_hops]
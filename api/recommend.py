@@ -0,0 +1,199 @@
+"""Рекомендации "часто покупают вместе" по истории продаж.
+
+Матрица совместных покупок C[a, b] - сколько покупателей купили и товар a, и товар b.
+Она хранится разреженно в item_pairs, а top-N соседей каждого товара - в item_related,
+поэтому GET /items/{item_id}/related читает готовый список по первичному ключу.
+
+Новые продажи дополняют матрицу при оформлении заказа (record_purchases). Полный пересчёт
+нужен один раз - для уже накопленных продаж (нужны numpy и scipy):
+    python recommend.py rebuild [--batch-users 5000]
+Продажи, оформленные во время пересчёта, могут в него не попасть - запускайте его в тихое время.
+"""
+from sqlalchemy import select, func, delete, insert, and_, or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import RELATED_ITEMS_LIMIT, RECOMMEND_BATCH_USERS
+from database import dialect_insert
+from models import Item as DBItem, Sale, ItemPair, RelatedItem
+import argparse
+import logging
+import sys
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # numpy/scipy не установлены - доступно только пополнение матрицы при покупках
+    np = sparse = None
+
+logger = logging.getLogger("shop.recommend")
+
+INSERT_BATCH_SIZE = 5000
+
+
+def related_query(item_id: str, columns: list, limit: int = RELATED_ITEMS_LIMIT):
+    return (
+        select(*columns)
+        .select_from(RelatedItem)
+        .join(DBItem, DBItem.id == RelatedItem.related_id)
+        .where(RelatedItem.item_id == item_id, RelatedItem.rank <= limit)
+        .order_by(RelatedItem.rank)
+    )
+
+
+async def related_items(db: AsyncSession, item_id: str, columns: list, limit: int = RELATED_ITEMS_LIMIT):
+    return (await db.execute(related_query(item_id, columns, limit))).all()
+
+
+def purchases_query(user_id: str):
+    # Сколько раз покупатель брал каждый товар
+    return select(Sale.item_id, func.count()).where(Sale.user_id == user_id).group_by(Sale.item_id)
+
+
+async def refresh_related(db: AsyncSession, item_ids) -> None:
+    # Пересчитываем top-N только для товаров, чьи строки матрицы изменились
+    item_ids = sorted(item_ids)
+    rank = func.row_number().over(partition_by=ItemPair.item_id, order_by=(ItemPair.count.desc(), ItemPair.other_id))
+    ranked = (
+        select(ItemPair.item_id, ItemPair.other_id, ItemPair.count, rank.label('rank'))
+        .where(ItemPair.item_id.in_(item_ids))
+        .subquery()
+    )
+    rows = (await db.execute(select(ranked).where(ranked.c.rank <= RELATED_ITEMS_LIMIT))).all()
+
+    # Параллельные заказы пересчитывают списки одних и тех же товаров. DELETE + INSERT в этом
+    # случае падал на первичном ключе и откатывал вместе с собой и пополнение item_pairs,
+    # поэтому строки (item_id, rank) обновляются на месте в порядке ключа, а лишние ранги удаляются
+    if rows:
+        stmt = dialect_insert(db, RelatedItem.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RelatedItem.item_id, RelatedItem.rank],
+            set_={"related_id": stmt.excluded.related_id, "score": stmt.excluded.score},
+        )
+        await db.execute(stmt, [
+            {"item_id": row.item_id, "rank": row.rank, "related_id": row.other_id, "score": row.count}
+            for row in sorted(rows, key=lambda row: (row.item_id, row.rank))
+        ])
+    sizes = {item_id: 0 for item_id in item_ids}
+    for row in rows:
+        sizes[row.item_id] = max(sizes[row.item_id], row.rank)
+    await db.execute(delete(RelatedItem).where(or_(*[
+        and_(RelatedItem.item_id == item_id, RelatedItem.rank > size) for item_id, size in sizes.items()
+    ])))
+
+
+async def record_purchases(db: AsyncSession, user_id: str, item_ids: list) -> set:
+    """Добавляет в матрицу пары с товарами, которые покупатель купил впервые.
+
+    Вызывается после оформления заказа, продажи уже сохранены. Пара увеличивается на
+    единицу, только если хотя бы один из её товаров новый для покупателя - так матрица
+    совпадает с полным пересчётом, где каждый покупатель учитывается один раз.
+    Ошибка здесь не отменяет заказ: она пишется в журнал, матрицу поправит rebuild.
+    Возвращает id товаров, чьи списки рекомендаций пересчитаны.
+    """
+    try:
+        result = await db.execute(purchases_query(user_id))
+        bought = dict(result.all())
+        new = {item_id for item_id in item_ids if bought.get(item_id, 0) <= 1}
+        pairs = sorted({pair for a in new for b in bought if a != b for pair in ((a, b), (b, a))})
+        if not pairs:
+            return set()
+
+        # Пары в порядке ключа: параллельные заказы блокируют строки в одном порядке
+        stmt = dialect_insert(db, ItemPair.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ItemPair.item_id, ItemPair.other_id],
+            set_={"count": ItemPair.__table__.c.count + stmt.excluded.count},
+        )
+        await db.execute(stmt, [{"item_id": a, "other_id": b, "count": 1} for a, b in pairs])
+        changed = {a for a, _ in pairs}
+        await refresh_related(db, changed)
+        await db.commit()
+        return changed
+    except SQLAlchemyError:
+        await db.rollback()
+        logger.exception("Не удалось обновить рекомендации после заказа пользователя %s", user_id)
+        return set()
+
+
+def iter_sales_chunks(db, batch_users: int):
+    # Пачки целых покупателей (все их продажи сразу): пары считаются внутри покупателя
+    last_user = None
+    while True:
+        query = select(Sale.user_id).distinct().order_by(Sale.user_id).limit(batch_users)
+        if last_user is not None:
+            query = query.where(Sale.user_id > last_user)
+        users = db.execute(query).scalars().all()
+        if not users:
+            break
+        rows = db.execute(
+            select(Sale.user_id, Sale.item_id).where(Sale.user_id >= users[0], Sale.user_id <= users[-1])
+        ).all()
+        yield rows
+        last_user = users[-1]
+
+
+def build_matrix(db, item_ids: list, batch_users: int):
+    index = {item_id: position for position, item_id in enumerate(item_ids)}
+    matrix = sparse.csr_matrix((len(item_ids), len(item_ids)), dtype=np.int32)
+    for rows in iter_sales_chunks(db, batch_users):
+        _, user_codes = np.unique([row.user_id for row in rows], return_inverse=True)
+        item_codes = np.fromiter((index[row.item_id] for row in rows), dtype=np.int64, count=len(rows))
+        # Матрица покупатель x товар из нулей и единиц: повторные покупки не считаются
+        bought = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (user_codes, item_codes)),
+                                   shape=(user_codes.max() + 1, len(item_ids)))
+        bought.data[:] = 1
+        matrix = matrix + bought.T @ bought
+    # Диагональ (товар сам с собой) не нужна
+    matrix = matrix - sparse.diags(matrix.diagonal(), dtype=np.int32)
+    matrix.eliminate_zeros()
+    return matrix.tocsr()
+
+
+def top_neighbors(matrix, limit: int):
+    # Для каждой строки - до limit соседей по убыванию числа совместных покупок
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            continue
+        counts, columns = matrix.data[start:end], matrix.indices[start:end]
+        order = np.lexsort((columns, -counts))[:limit]
+        yield row, columns[order], counts[order]
+
+
+def rebuild(batch_users: int = RECOMMEND_BATCH_USERS) -> None:
+    from database import SessionLocal
+
+    if np is None:
+        sys.exit("Для пересчёта рекомендаций нужны numpy и scipy")
+
+    with SessionLocal() as db:
+        item_ids = db.execute(select(DBItem.id).order_by(DBItem.id)).scalars().all()
+        matrix = build_matrix(db, item_ids, batch_users)
+
+        # Обе таблицы заменяются одной транзакцией: читатели видят либо старые, либо новые данные
+        db.execute(delete(RelatedItem))
+        db.execute(delete(ItemPair))
+        pairs = matrix.tocoo()
+        for start in range(0, pairs.nnz, INSERT_BATCH_SIZE):
+            end = start + INSERT_BATCH_SIZE
+            db.execute(insert(ItemPair), [
+                {"item_id": item_ids[a], "other_id": item_ids[b], "count": int(count)}
+                for a, b, count in zip(pairs.row[start:end], pairs.col[start:end], pairs.data[start:end])
+            ])
+
+        related = []
+        for row, columns, counts in top_neighbors(matrix, RELATED_ITEMS_LIMIT):
+            related.extend({"item_id": item_ids[row], "rank": rank, "related_id": item_ids[column], "score": int(count)}
+                           for rank, (column, count) in enumerate(zip(columns, counts), start=1))
+        for start in range(0, len(related), INSERT_BATCH_SIZE):
+            db.execute(insert(RelatedItem), related[start:start + INSERT_BATCH_SIZE])
+        db.commit()
+    print(f"товаров: {len(item_ids)}, пар: {pairs.nnz}, рекомендаций: {len(related)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--batch-users', type=int, default=RECOMMEND_BATCH_USERS)
+    args = parser.parse_args()
+    rebuild(args.batch_users)
@@ -0,0 +1,69 @@
+from sqlalchemy import select, func, literal_column, null, true, text, union_all, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from models import Item as DBItem, ITEM_SEARCH_VECTOR
+import re
+
+# Поля, по которым считаются фасеты (мультивыбор)
+FACET_FIELDS = ('pol', 'types', 'size', 'color')
+
+
+def fts_condition(dialect: str, q: str):
+    if dialect == 'postgresql':
+        return literal_column(ITEM_SEARCH_VECTOR).op('@@')(func.plainto_tsquery(literal_column("'russian'"), q))
+
+    # SQLite FTS5: каждое слово берём в кавычки, чтобы спецсимволы не ломали синтаксис MATCH
+    terms = ' '.join('"{}"'.format(word.replace('"', '')) for word in re.findall(r'\w+', q))
+    match = text('items_fts MATCH :fts_query').bindparams(fts_query=terms or '""')
+    return literal_column('items.rowid').in_(select(literal_column('rowid')).select_from(text('items_fts')).where(match))
+
+
+def build_conditions(dialect: str, q: Optional[str], price_min: Optional[int], price_max: Optional[int],
+                     facets: dict) -> dict:
+    """Условия фильтрации по группам: 'base' - общие, остальные - по одному на фасет.
+
+    Для мультивыбора счётчики фасета считаются без его собственного фильтра, иначе
+    после выбора одного значения остальные варианты пропали бы из списка.
+    """
+    base = []
+    if q:
+        base.append(fts_condition(dialect, q))
+    if price_min is not None:
+        base.append(DBItem.price >= price_min)
+    if price_max is not None:
+        base.append(DBItem.price <= price_max)
+
+    conditions = {'base': base}
+    for field in FACET_FIELDS:
+        values = facets.get(field)
+        conditions[field] = [getattr(DBItem, field).in_(values)] if values else []
+    return conditions
+
+
+def all_conditions(conditions: dict, exclude: Optional[str] = None) -> list:
+    return [condition for group, items in conditions.items() if group != exclude for condition in items]
+
+
+async def facet_counts(db: AsyncSession, conditions: dict) -> tuple[int, dict]:
+    # Все счётчики (и общее число найденных товаров) - одним запросом через UNION ALL
+    parts = [
+        select(literal_column("'total'").label('facet'), null().label('value'), func.count().label('count'))
+        .select_from(DBItem).where(and_(true(), *all_conditions(conditions)))
+    ]
+    for field in FACET_FIELDS:
+        column = getattr(DBItem, field)
+        parts.append(
+            select(literal_column(f"'{field}'").label('facet'), column.label('value'), func.count().label('count'))
+            .where(and_(true(), *all_conditions(conditions, exclude=field)))
+            .group_by(column)
+        )
+    result = await db.execute(union_all(*parts))
+
+    total = 0
+    facets = {field: {} for field in FACET_FIELDS}
+    for facet, value, count in result:
+        if facet == 'total':
+            total = count
+        elif value is not None:
+            facets[facet][value] = count
+    return total, facets
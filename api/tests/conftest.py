@@ -0,0 +1,100 @@
+# Тесты идут на SQLite во временной папке, приложение работает в том же процессе (httpx + ASGI).
+# Окружение готовим до импорта модулей приложения: config.py читает его при импорте
+import os
+import sys
+import tempfile
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = tempfile.mkdtemp(prefix='shop-tests-')
+DB_PATH = os.path.join(TEST_DIR, 'shop.db')
+
+os.environ['URL_DATABASE'] = f"sqlite:///{DB_PATH}"
+os.environ['ASYNC_URL_DATABASE'] = f"sqlite+aiosqlite:///{DB_PATH}"
+os.environ['STATIC_DIR'] = os.path.join(TEST_DIR, 'static')
+os.makedirs(os.environ['STATIC_DIR'])
+os.environ.setdefault('REGISTER_RATE_PER_IP', '1000/1')
+os.environ.setdefault('LOGIN_RATE_PER_IP', '1000/1')
+os.environ.setdefault('LOGIN_RATE_PER_EMAIL', '1000/1')
+os.environ.setdefault('RATE_LIMIT_BACKEND', 'memory')
+
+sys.path.insert(0, API_DIR)
+os.chdir(API_DIR)  # шаблоны подключаются по относительному пути
+
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+import auth
+import favorites
+from database import Base, engine, async_engine
+from main import app, catalog_cache
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture(scope='session', autouse=True)
+def engine_pool():
+    yield
+    # Соединения aiosqlite держат свои потоки - без закрытия пула процесс не завершится
+    asyncio.run(async_engine.dispose())
+
+
+@pytest.fixture(autouse=True)
+def database():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+    catalog_cache.bump()
+    auth.token_cache.clear()
+    auth.role_changes.clear()
+    favorites.favorites_cache.clear()
+
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def query_counter():
+    """Считает SQL-запросы приложения: counter.count обнуляется через counter.reset()."""
+    class Counter:
+        count = 0
+
+        def reset(self):
+            self.count = 0
+
+        def __call__(self, *args):
+            self.count += 1
+
+    counter = Counter()
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', counter)
+    yield counter
+    event.remove(async_engine.sync_engine, 'before_cursor_execute', counter)
+
+
+ITEM = dict(title="Платье", pol="W", types="платье", description="Летнее платье", price=1000, size="M",
+            color="красный", image_url="/static/tovar.webp", quantity=10)
+
+
+async def register(client, name: str, role: str = None) -> str:
+    """Регистрирует пользователя (cookie с токеном остаётся в client) и возвращает его id."""
+    await client.post("/users/", json={"username": name, "email": f"{name}@example.com", "password": "passw0rdx"})
+    user_id = auth.jwt.decode(client.cookies["access_token"], auth.SECRET_KEY, algorithms=[auth.ALGORITHM])["sub"]
+    if role:
+        await client.put(f"/users/{user_id}", json={"role": role})
+    return user_id
+
+
+async def create_items(client, count: int, **fields) -> list:
+    for number in range(count):
+        response = await client.post("/items/", json={**ITEM, "title": f"Товар {number}", **fields})
+        assert response.status_code == 200
+    response = await client.get("/items/search", params={"limit": 100})
+    return [item["id"] for item in response.json()["items"]]
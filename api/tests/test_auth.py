@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from sqlalchemy import select
+
+import auth
+from conftest import ITEM, register
+from database import AsyncSessionLocal
+from models import User as DBUser
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_deleted_admin_loses_access(client):
+    user_id = await register(client, "admina", role="admin")
+    assert (await client.get("/admin")).status_code == 200
+
+    assert (await client.delete(f"/users/{user_id}/")).status_code == 200
+
+    assert (await client.get("/admin")).status_code == 401
+    response = await client.post("/items/import", files={"file": ("items.csv", "title\n")})
+    assert response.status_code == 401
+
+
+async def test_role_change_reaches_other_workers(client, tmp_path, monkeypatch):
+    # Второй воркер видит отзыв через общий файл и перестаёт доверять роли из токена
+    user_id = await register(client, "adminb", role="admin")
+    monkeypatch.setattr(auth, "revocations", auth.FileVersionNotifier(str(tmp_path / "revoked")))
+    assert (await client.get("/admin")).status_code == 200
+
+    # Роль понизили в другом процессе: там опубликован отзыв, а запись в role_changes есть только у него
+    await client.put(f"/users/{user_id}", json={"role": "client"})
+    auth.role_changes.clear()
+
+    assert (await client.get("/admin")).status_code == 403
+
+
+async def test_full_hash_pool_rejects_with_503(client, monkeypatch):
+    await register(client, "waiting")
+    monkeypatch.setattr(auth, "HASH_WORKERS", 1)
+    monkeypatch.setattr(auth, "HASH_QUEUE_LIMIT", 0)
+    release = threading.Event()
+    busy = asyncio.create_task(auth.run_in_hash_pool(release.wait, 5))
+    await asyncio.sleep(0.01)
+    assert auth.hash_in_flight == 1
+
+    try:
+        with pytest.raises(HTTPException) as rejected:
+            await auth.hash_password_async("passw0rdx")
+        assert rejected.value.status_code == 503
+        assert rejected.value.headers["Retry-After"] == "1"
+        # Отказ не занимает место в очереди
+        assert auth.hash_in_flight == 1
+
+        response = await client.post("/login/", data={"username": "waiting@example.com", "password": "passw0rdx"})
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+    finally:
+        release.set()
+        await busy
+    assert auth.hash_in_flight == 0
+    response = await client.post("/login/", data={"username": "waiting@example.com", "password": "passw0rdx"})
+    assert response.status_code == 200
+
+
+async def test_login_rehashes_password_with_new_settings(client, monkeypatch):
+    monkeypatch.setattr(auth, "pwd_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=4))
+    user_id = await register(client, "rehash")
+    assert (await stored_hash(user_id)).startswith("$2b$04$")
+
+    # Минимальное число раундов подняли: при входе пароль сохраняется с новыми параметрами
+    monkeypatch.setattr(auth, "pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto",
+                                                          bcrypt__rounds=5, bcrypt__min_rounds=5))
+    response = await client.post("/login/", data={"username": "rehash@example.com", "password": "passw0rdx"})
+    assert response.status_code == 200
+    new_hash = await stored_hash(user_id)
+    assert new_hash.startswith("$2b$05$")
+    assert auth.verify_password("passw0rdx", new_hash)
+
+    # Следующий вход хеш уже не меняет
+    await client.post("/login/", data={"username": "rehash@example.com", "password": "passw0rdx"})
+    assert await stored_hash(user_id) == new_hash
+
+
+async def stored_hash(user_id: str) -> str:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(DBUser.password).where(DBUser.id == user_id))
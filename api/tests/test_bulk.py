@@ -0,0 +1,63 @@
+import json
+
+import pytest
+from sqlalchemy import delete
+
+from conftest import ITEM, create_items, register
+from database import AsyncSessionLocal
+from models import Item as DBItem
+
+pytestmark = pytest.mark.anyio
+
+
+async def import_file(client, name: str, content: str, **params) -> dict:
+    response = await client.post("/items/import", params=params, files={"file": (name, content.encode())})
+    assert response.status_code == 200
+    return response.json()
+
+
+async def export(client, fmt: str) -> str:
+    response = await client.get("/items/export", params={"format": fmt})
+    assert response.status_code == 200
+    return response.text
+
+
+async def test_import_reports_bad_rows_and_keeps_good_ones(client):
+    await register(client, "admin", role="admin")
+    header = ",".join(ITEM)
+    good = ",".join(str(value) for value in ITEM.values())
+    bad_price = good.replace(",1000,", ",дорого,")
+    report = await import_file(client, "items.csv", f"{header}\n{good}\n{bad_price}\n{good},лишнее\n")
+    assert report["processed"] == 3
+    assert report["imported"] == 1
+    assert report["failed"] == 2
+    assert [error["row"] for error in report["errors"]] == [2, 3]
+
+    report = await import_file(client, "items.ndjson", json.dumps(ITEM) + "\n{не json\n\n[1]\n")
+    assert (report["imported"], report["failed"]) == (1, 2)
+    assert "Некорректный JSON" in report["errors"][0]["error"]
+    assert report["errors"][1] == {"row": 4, "error": "Строка должна быть объектом"}
+
+
+async def test_import_updates_items_with_existing_id(client):
+    await register(client, "admin", role="admin")
+    item_id = (await create_items(client, 2))[0]
+
+    report = await import_file(client, "items.ndjson", json.dumps({**ITEM, "id": item_id, "price": 777}) + "\n")
+    assert report["imported"] == 1
+    assert (await client.get(f"/items/{item_id}")).json()["price"] == 777
+    assert len((await export(client, "ndjson")).splitlines()) == 2
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+async def test_export_then_import_restores_catalog(client, fmt):
+    await register(client, "admin", role="admin")
+    await create_items(client, 5)
+    exported = await export(client, fmt)
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(DBItem))
+        await db.commit()
+    report = await import_file(client, f"items.{fmt}", exported, format=fmt)
+    assert (report["imported"], report["failed"]) == (5, 0)
+    assert await export(client, fmt) == exported
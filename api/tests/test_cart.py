@@ -0,0 +1,24 @@
+import pytest
+
+from conftest import ITEM, create_items, register
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("count", [1, 10, 40])
+async def test_cart_page_is_one_query(client, query_counter, count):
+    await register(client, "admin", role="admin")
+    ids = await create_items(client, count)
+    for item_id in ids:
+        await client.post("/add-to-cart", json={"item_id": item_id, "quantity": 2})
+
+    query_counter.reset()
+    response = await client.get("/cart")
+    assert response.status_code == 200
+    assert query_counter.count == 1
+
+    query_counter.reset()
+    summary = (await client.get("/cart/summary")).json()
+    assert query_counter.count == 1
+    assert summary["count"] == 2 * count
+    assert summary["total"] == 2 * count * ITEM["price"]
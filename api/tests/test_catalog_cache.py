@@ -0,0 +1,35 @@
+import pytest
+
+import main
+from cache import CatalogCache
+from conftest import create_items
+
+pytestmark = pytest.mark.anyio
+
+
+def test_page_read_before_bump_is_not_served_after_it():
+    cache = CatalogCache()
+    version = cache.version
+    assert cache.get(version, 'page') is None
+    cache.bump()  # товар изменили, пока запрос ждал базу
+    cache.set(version, 'page', 'STALE')
+    assert cache.get(cache.version, 'page') is None
+
+
+async def test_catalog_changed_during_read_is_reloaded(client, monkeypatch, query_counter):
+    await create_items(client, 3)
+    original = main.keyset_page
+
+    async def read_then_change(*args, **kwargs):
+        page = await original(*args, **kwargs)
+        main.catalog_cache.bump()  # PUT /items/... завершился, пока страница собиралась
+        return page
+
+    monkeypatch.setattr(main, "keyset_page", read_then_change)
+    first = await client.get("/items/")
+    monkeypatch.setattr(main, "keyset_page", original)
+
+    query_counter.reset()
+    second = await client.get("/items/", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert query_counter.count > 0
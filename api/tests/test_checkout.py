@@ -0,0 +1,87 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, func
+from sqlalchemy.exc import OperationalError
+
+import cart
+import main
+from cart import checkout
+from conftest import ITEM, create_items, register
+from database import AsyncSessionLocal
+from models import User as DBUser, Item as DBItem, CartItem, Sale
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_checkouts_never_oversell():
+    # 500 покупателей одновременно забирают по одной штуке из 100 на складе
+    async with AsyncSessionLocal() as db:
+        item = DBItem(**{**ITEM, "quantity": 100})
+        users = [DBUser(username=f"buyer{number}", email=f"buyer{number}@example.com", password="-") for number in range(500)]
+        db.add(item)
+        db.add_all(users)
+        await db.flush()
+        db.add_all(CartItem(user_id=user.id, item_id=item.id, quantity=1) for user in users)
+        await db.commit()
+        item_id, user_ids = item.id, [user.id for user in users]
+
+    async def buy(user_id):
+        async with AsyncSessionLocal() as db:
+            try:
+                await checkout(db, user_id)
+                return 200
+            except HTTPException as error:
+                return error.status_code
+
+    started = time.perf_counter()
+    codes = await asyncio.gather(*(buy(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - started
+    print(f"\n{len(codes)} оформлений за {elapsed:.2f} с: {len(codes) / elapsed:.0f} оформлений/с, "
+          f"успешных {codes.count(200)}, 409: {codes.count(409)}, 503: {codes.count(503)}")
+    assert codes.count(200) == 100
+    # Остальные получают отказ (нет товара или база занята), но не 500
+    assert set(codes) <= {200, 409, 503}
+
+    async with AsyncSessionLocal() as db:
+        assert await db.scalar(select(DBItem.quantity).where(DBItem.id == item_id)) == 0
+        assert await db.scalar(select(func.sum(Sale.quantity))) == 100
+
+
+async def test_checkout_keeps_catalog_cache_and_shows_fresh_stock(client, query_counter):
+    await register(client, "admin", role="admin")
+    item_id = (await create_items(client, 1))[0]
+    etag = (await client.get(f"/items/{item_id}")).headers["etag"]
+    await client.get("/")
+    version = main.catalog_cache.version
+
+    await client.post("/add-to-cart", json={"item_id": item_id, "quantity": 3})
+    order = (await client.post("/checkout")).json()
+    assert order["items"] == [{"item_id": item_id, "quantity": 3, "total_amount": 3 * ITEM["price"]}]
+    assert main.catalog_cache.version == version
+
+    query_counter.reset()
+    await client.get("/")
+    response = await client.get(f"/items/{item_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["quantity"] == ITEM["quantity"] - 3
+    # Витрина целиком из кеша, у товара из кеша только остаток
+    assert query_counter.count == 1
+
+
+@pytest.mark.parametrize("error, status_code", [
+    (sqlite3.OperationalError("database is locked"), 503),
+    (type("SerializationError", (Exception,), {"sqlstate": "40001"})(), 409),
+])
+async def test_lock_conflicts_are_not_server_errors(monkeypatch, error, status_code):
+    async def locked(db, user_id):
+        raise OperationalError("DELETE FROM cart", {}, error)
+
+    monkeypatch.setattr(cart, "take_cart_lines", locked)
+    async with AsyncSessionLocal() as db:
+        with pytest.raises(HTTPException) as raised:
+            await checkout(db, "00000000-0000-0000-0000-000000000000")
+    assert raised.value.status_code == status_code
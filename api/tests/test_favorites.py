@@ -0,0 +1,80 @@
+import pytest
+
+import favorites
+import main
+from conftest import create_items, register
+from database import AsyncSessionLocal
+from models import FavoriteItem
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("count", [1, 10, 40])
+async def test_catalog_page_query_count_does_not_grow_with_favorites(client, query_counter, count):
+    user_id = await register(client, "admin", role="admin")
+    ids = await create_items(client, 40)
+    for item_id in ids[:count]:
+        assert (await client.post(f"/favorites/{item_id}")).status_code == 200
+
+    main.catalog_cache.bump()
+    favorites.favorites_cache.clear()
+    query_counter.reset()
+    response = await client.get("/")
+    assert response.status_code == 200
+    # Страница каталога и множество избранного - по одному запросу
+    assert query_counter.count == 2
+    assert len(await favorite_ids_of(user_id)) == count
+
+
+async def favorite_ids_of(user_id):
+    async with AsyncSessionLocal() as db:
+        return await favorites.favorite_ids(db, user_id)
+
+
+async def test_favorites_changed_during_read_are_not_cached(client, query_counter, monkeypatch):
+    user_id = await register(client, "buyer")
+    original_execute = favorites.AsyncSession.execute
+
+    async def execute_then_change(self, *args, **kwargs):
+        result = await original_execute(self, *args, **kwargs)
+        favorites._invalidate(user_id)  # POST /favorites/... завершился, пока шёл запрос
+        return result
+
+    monkeypatch.setattr(favorites.AsyncSession, "execute", execute_then_change)
+    await favorite_ids_of(user_id)
+    monkeypatch.undo()
+    assert favorites.favorites_cache.get(user_id) is None
+
+
+def test_version_survives_eviction_as_a_new_value():
+    first = favorites.favorites_version("someone")
+    favorites._versions.clear()  # метку вытеснили из ограниченного кеша
+    assert favorites.favorites_version("someone") != first
+
+
+async def test_favorites_list_can_be_used_to_remove_items(client):
+    await register(client, "admin", role="admin")
+    item_id = (await create_items(client, 1))[0]
+    await client.post(f"/favorites/{item_id}")
+
+    listed = (await client.get("/favorites")).json()
+    assert [item["id"] for item in listed] == [item_id]
+    assert (await client.delete(f"/favorites/{listed[0]['id']}")).status_code == 200
+    assert (await client.get("/favorites")).json() == []
+
+
+async def test_catalog_etag_follows_favorites_changed_by_another_worker(client):
+    user_id = await register(client, "admin", role="admin")
+    item_id = (await create_items(client, 1))[0]
+    etag = (await client.get("/")).headers["etag"]
+
+    # Другой воркер добавил товар в избранное: версия этого процесса не изменилась,
+    # а закешированное множество истекло по FAVORITES_CACHE_TTL
+    async with AsyncSessionLocal() as db:
+        db.add(FavoriteItem(user_id=user_id, item_id=item_id))
+        await db.commit()
+    favorites.favorites_cache.clear()
+
+    response = await client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
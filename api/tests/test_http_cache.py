@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from conftest import create_items, register
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("logged_in", [False, True])
+async def test_unchanged_storefront_is_304_without_queries(client, query_counter, logged_in):
+    await register(client, "admin", role="admin")
+    await create_items(client, 3)
+    if not logged_in:
+        client.cookies.clear()
+    etag = (await client.get("/")).headers["etag"]
+
+    query_counter.reset()
+    response = await client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert query_counter.count == 0
+
+
+async def test_unchanged_item_list_is_304_without_queries(client, query_counter):
+    await register(client, "admin", role="admin")
+    await create_items(client, 3)
+    params = {"fields": "id,title"}
+    etag = (await client.get("/items/", params=params)).headers["etag"]
+
+    query_counter.reset()
+    response = await client.get("/items/", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert query_counter.count == 0
+
+    # ETag, ослабленный прокси (W/), тоже совпадает
+    response = await client.get("/items/", params=params, headers={"If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+
+    await create_items(client, 1)
+    response = await client.get("/items/", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+async def test_only_fingerprinted_static_files_are_immutable(client):
+    static_dir = os.environ['STATIC_DIR']
+    os.makedirs(os.path.join(static_dir, 'variants'), exist_ok=True)
+    for path in ('variants/0123456789abcdef-320.webp', 'style.css'):
+        with open(os.path.join(static_dir, path), 'wb') as file:
+            file.write(b'data')
+
+    response = await client.get("/static/variants/0123456789abcdef-320.webp")
+    assert "immutable" in response.headers["cache-control"]
+
+    response = await client.get("/static/style.css")
+    assert response.headers["cache-control"] == "public, no-cache"
+    response = await client.get("/static/style.css", headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+import threading
+
+import pytest
+
+import images
+from conftest import create_items, register
+
+pytestmark = pytest.mark.skipif(images.Image is None, reason="нужен Pillow")
+
+
+@pytest.fixture(autouse=True)
+def clean_variants():
+    yield
+    shutil.rmtree(images.VARIANTS_DIR, ignore_errors=True)
+    images.reload_manifest()
+
+
+def test_batch_of_identical_images_updates_manifest_once():
+    # Пять товаров с одинаковой картинкой: копии пишутся в одну папку из разных потоков
+    image_urls = []
+    for number in range(5):
+        images.Image.new('RGB', (800, 600), 'red').save(os.path.join(images.STATIC_DIR, f"same{number}.png"))
+        image_urls.append(f"/static/same{number}.png")
+
+    calls = []
+    finished = threading.Event()
+    images.schedule_variants(image_urls, on_complete=lambda: (calls.append(1), finished.set()))
+    assert finished.wait(30)
+
+    digests = {images.manifest[image_url] for image_url in image_urls}
+    assert len(digests) == 1
+    target_dir = os.path.join(images.VARIANTS_DIR, digests.pop())
+    assert sorted(os.listdir(target_dir)) == sorted(f"{width}.webp" for width in images.IMAGE_WIDTHS)
+    assert calls == [1]
+
+
+def test_manifest_written_by_another_process_is_picked_up():
+    assert images.image_srcset('/static/other.png') is None
+    os.makedirs(images.VARIANTS_DIR, exist_ok=True)
+    with open(images.MANIFEST_PATH, 'w') as f:
+        json.dump({'/static/other.png': 'abc'}, f)
+    assert images.image_srcset('/static/other.png').startswith(f"{images.VARIANTS_URL}/abc/")
+
+
+@pytest.mark.anyio
+async def test_cached_storefront_does_not_stat_the_manifest(client, monkeypatch):
+    await register(client, "admin", role="admin")
+    await create_items(client, 10)
+    await client.get("/")
+
+    stats = []
+    original = images._manifest_stat
+    monkeypatch.setattr(images, "_manifest_stat", lambda: stats.append(1) or original())
+    response = await client.get("/")
+    assert response.status_code == 200
+    # srcset уже лежит в закешированных словарях страницы
+    assert stats == []
@@ -0,0 +1,37 @@
+import pytest
+
+import main
+from conftest import create_items, register
+
+pytestmark = pytest.mark.anyio
+
+
+def series(text: str, name: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(name + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    raise AssertionError(f"нет серии {name}")
+
+
+async def test_metrics_count_sql_queries_per_route(client, query_counter):
+    await register(client, "admin", role="admin")
+    item_ids = await create_items(client, 3)
+    for item_id in item_ids:
+        await client.post("/add-to-cart", json={"item_id": item_id, "quantity": 1})
+    for histogram in (main.metrics.latency, main.metrics.queries):
+        histogram.pop(("GET", "/cart"), None)
+
+    query_counter.reset()
+    assert (await client.get("/cart")).status_code == 200
+    assert (await client.get("/cart")).status_code == 200
+    sql_per_request = query_counter.count / 2
+    assert sql_per_request >= 1
+
+    # Обработчики событий SQLAlchemy выполняются в greenlet асинхронного движка, но видят
+    # статистику запроса из ContextVar, которую выставил MetricsMiddleware
+    text = (await client.get("/metrics")).text
+    labels = '{method="GET",route="/cart"}'
+    assert series(text, f"http_request_db_queries_count{labels}") == 2
+    assert series(text, f"http_request_db_queries_sum{labels}") == 2 * sql_per_request
+    assert series(text, f"http_request_duration_seconds_count{labels}") == 2
+    assert series(text, 'http_request_db_queries_bucket{method="GET",route="/cart",le="0"}') == 0
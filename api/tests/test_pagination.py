@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import create_items, register
+from main import ITEM_FIELDS, ITEM_OUT_FIELDS
+from pagination import encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+CATALOG_ROUTES = ["/items/", "/", "/items/search"]
+
+
+@pytest.mark.parametrize("route", CATALOG_ROUTES)
+@pytest.mark.parametrize("values", [["not-a-uuid"], [{"a": 1}], [1], [None]])
+async def test_cursor_of_wrong_type_is_rejected(client, route, values):
+    await register(client, "admin", role="admin")
+    await create_items(client, 3)
+    response = await client.get(route, params={"cursor": encode_cursor(values)})
+    assert response.status_code == 400
+    assert "Неверный курсор" in response.text
+
+
+@pytest.mark.parametrize("values", [["x", "y"], [1000, 5], [True, "00000000-0000-0000-0000-000000000000"]])
+async def test_price_cursor_of_wrong_type_is_rejected(client, values):
+    response = await client.get("/items/", params={"sort": "price", "cursor": encode_cursor(values)})
+    assert response.status_code == 400
+
+
+async def test_pages_follow_each_other(client):
+    await register(client, "admin", role="admin")
+    await create_items(client, 5)
+    seen = []
+    params = {"sort": "price", "limit": 2}
+    while True:
+        response = await client.get("/items/", params=params)
+        seen.extend(item["title"] for item in response.json())
+        if "x-next-cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["x-next-cursor"]
+    assert sorted(seen) == [f"Товар {number}" for number in range(5)]
+
+
+async def test_item_lists_document_selectable_fields(client):
+    await register(client, "admin", role="admin")
+    await create_items(client, 2)
+    openapi = (await client.get("/openapi.json")).json()
+    # Любое поле из fields= (и id в /related) описано в схеме ответа
+    assert set(openapi["components"]["schemas"]["ItemFields"]["properties"]) == set(ITEM_FIELDS)
+    for path in ["/items/", "/items/{item_id}/related"]:
+        schema = openapi["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert schema["items"]["$ref"] == "#/components/schemas/ItemFields"
+    assert set((await client.get("/items/")).json()[0]) == set(ITEM_OUT_FIELDS)
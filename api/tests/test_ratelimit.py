@@ -0,0 +1,45 @@
+import pytest
+from starlette.requests import Request
+
+import main
+from ratelimit import RateLimiter, MemoryBucketStore, SQLiteBucketStore, client_ip
+
+pytestmark = pytest.mark.anyio
+
+
+def make_request(forwarded: str = None) -> Request:
+    headers = [(b'x-forwarded-for', forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": ("10.0.0.1", 5000)})
+
+
+def test_client_ip_ignores_addresses_supplied_by_client():
+    assert client_ip(make_request("1.2.3.4"), proxy_hops=0) == "10.0.0.1"
+    # Левые записи клиент может подделать, правую дописал наш прокси
+    assert client_ip(make_request("6.6.6.6, 203.0.113.7"), proxy_hops=1) == "203.0.113.7"
+    assert client_ip(make_request("6.6.6.6, 203.0.113.7, 10.0.0.2"), proxy_hops=2) == "203.0.113.7"
+    assert client_ip(make_request(), proxy_hops=1) == "10.0.0.1"
+
+
+async def test_spoofed_forwarded_for_does_not_bypass_login_limit(client, monkeypatch):
+    monkeypatch.setattr(main, "RATE_LIMIT_PROXY_HOPS", 1)
+    monkeypatch.setattr(main, "login_ip_limiter", RateLimiter('login-ip', '3/60', MemoryBucketStore()))
+    codes = []
+    for attempt in range(5):
+        response = await client.post("/login/", data={"username": f"u{attempt}@example.com", "password": "wrong1xx"},
+                                     headers={"X-Forwarded-For": f"6.6.6.{attempt}, 203.0.113.7"})
+        codes.append(response.status_code)
+    assert codes == [401, 401, 401, 429, 429]
+    assert int(response.headers["retry-after"]) >= 1
+
+
+def test_sqlite_store_prunes_full_buckets_by_index(tmp_path):
+    store = SQLiteBucketStore(str(tmp_path / "buckets.db"))
+    assert store.take("a", 2, 1.0) == 0
+    assert store.take("a", 2, 1.0) == 0
+    assert store.take("a", 2, 1.0) > 0
+    conn = store._connection()
+    plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN DELETE FROM rate_buckets WHERE expires < 1"))
+    assert "ix_rate_buckets_expires" in plan
+    assert store.prune(now=0) == 0
+    assert store.prune(now=10 ** 12) == 1
+    assert len(store) == 0
@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import delete, select
+
+from conftest import ITEM
+from database import AsyncSessionLocal
+from models import User as DBUser, Item as DBItem, ItemPair, RelatedItem, Sale
+from recommend import record_purchases, refresh_related
+
+pytestmark = pytest.mark.anyio
+
+
+async def related_of(db, item_id) -> list:
+    result = await db.execute(select(RelatedItem.related_id).where(RelatedItem.item_id == item_id).order_by(RelatedItem.rank))
+    return result.scalars().all()
+
+
+async def test_related_lists_are_updated_in_place():
+    async with AsyncSessionLocal() as db:
+        items = [DBItem(**{**ITEM, "title": f"Товар {number}"}) for number in range(4)]
+        users = [DBUser(username=f"buyer{number}", email=f"buyer{number}@example.com", password="-") for number in range(2)]
+        db.add_all(items + users)
+        await db.commit()
+        a, b, c, d = [str(item.id) for item in items]
+
+        # Первый покупатель: a, b, c; второй: a, c - у a в списке сначала c (2 покупки), потом b
+        for user, bought in ((users[0], [a, b, c]), (users[1], [a, c])):
+            db.add_all(Sale(user_id=user.id, item_id=item_id, quantity=1, total_amount=1) for item_id in bought)
+            await db.commit()
+            assert await record_purchases(db, str(user.id), bought) == set(bought)
+        assert await related_of(db, a) == [c, b]
+
+        # Список стал короче - лишний ранг удаляется, а не остаётся от прошлого пересчёта
+        await db.execute(delete(ItemPair).where(ItemPair.item_id == a, ItemPair.other_id == b))
+        await refresh_related(db, {a, d})
+        await db.commit()
+        assert await related_of(db, a) == [c]
+        assert await related_of(db, d) == []
@@ -0,0 +1,71 @@
+import pytest
+
+from conftest import ITEM, register
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_item(client, **fields) -> str:
+    response = await client.post("/items/", json={**ITEM, **fields})
+    assert response.status_code == 200
+    found = await client.get("/items/search", params={"q": fields["title"], "fields": "id"})
+    return found.json()["items"][0]["id"]
+
+
+async def search(client, **params) -> dict:
+    response = await client.get("/items/search", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_facet_counts_exclude_their_own_filter(client):
+    await register(client, "admin", role="admin")
+    for number, (color, size) in enumerate([("красный", "S"), ("красный", "M"), ("синий", "M"), ("чёрный", "L")]):
+        await add_item(client, title=f"Платье{number}", color=color, size=size)
+
+    result = await search(client, color=["красный"])
+    assert result["total"] == 2
+    # Остальные цвета остаются в списке, чтобы их можно было добавить к выбору
+    assert result["facets"]["color"] == {"красный": 2, "синий": 1, "чёрный": 1}
+    # Другие фасеты считаются уже с учётом выбранного цвета
+    assert result["facets"]["size"] == {"S": 1, "M": 1}
+
+    result = await search(client, color=["красный", "синий"], size=["M"])
+    assert result["total"] == 2
+    assert result["facets"]["color"] == {"красный": 1, "синий": 1}
+    assert result["facets"]["size"] == {"S": 1, "M": 2}
+
+
+async def test_full_text_search_follows_inserts_updates_and_deletes(client):
+    await register(client, "admin", role="admin")
+    item_id = await add_item(client, title="Куртка", description="Тёплая зимняя")
+    await add_item(client, title="Шорты", description="Летние")
+
+    assert [item["title"] for item in (await search(client, q="зимняя"))["items"]] == ["Куртка"]
+    # Спецсимволы запроса не ломают MATCH
+    assert (await search(client, q='"куртка*'))["total"] == 1
+
+    await client.put(f"/items/{item_id}", json={**ITEM, "title": "Пальто", "description": "Тёплое"})
+    assert (await search(client, q="куртка"))["total"] == 0
+    assert (await search(client, q="пальто"))["total"] == 1
+
+    await client.delete(f"/items/{item_id}")
+    assert (await search(client, q="пальто"))["total"] == 0
+    assert (await search(client, q="шорты"))["total"] == 1
+
+
+async def test_facets_are_counted_once_per_search(client, query_counter):
+    await register(client, "admin", role="admin")
+    for number in range(5):
+        await add_item(client, title=f"Рубашка{number}")
+
+    query_counter.reset()
+    assert (await search(client, q="рубашка1", limit=1))["total"] == 1
+    assert query_counter.count == 2  # страница и фасеты
+
+    query_counter.reset()
+    first = await search(client, pol=["W"], limit=2)
+    second = await search(client, pol=["W"], limit=2, cursor=first["next_cursor"])
+    assert query_counter.count == 3  # на второй странице фасеты уже из кеша
+    assert second["total"] == first["total"] == 5
+    assert second["facets"] == first["facets"]
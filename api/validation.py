@@ -1,4 +1,6 @@
 from pydantic import BaseModel, EmailStr, ValidationError
+from typing import Optional
+from uuid import UUID
 
 class Token(BaseModel):
     access_token: str
@@ -41,6 +43,9 @@ def validate_user_create(user_data: dict):
 class UserUpdate(BaseModel):
     role: str
 
+    class Config:
+        orm_mode = True
+
 
 class Item(BaseModel):
     title: str
@@ -53,10 +58,43 @@ class Item(BaseModel):
     image_url: str
     quantity: int
 
+    class Config:
+        orm_mode = True
+
 
 class ItemCreate(Item):
     pass
 
+
+# Товар в ответах API: вместе с готовым srcset уменьшенных копий картинки
+class ItemOut(Item):
+    image_srcset: Optional[str] = None
+
+
+# Товар в избранном: с id, чтобы его можно было убрать через DELETE /favorites/{item_id}
+class FavoriteOut(ItemOut):
+    id: UUID
+
+
+# Товар в списках с выбором полей (fields=): в ответ попадают только запрошенные поля
+class ItemFields(BaseModel):
+    id: Optional[UUID] = None
+    title: Optional[str] = None
+    pol: Optional[str] = None
+    types: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[int] = None
+    size: Optional[str] = None
+    color: Optional[str] = None
+    image_url: Optional[str] = None
+    quantity: Optional[int] = None
+    image_srcset: Optional[str] = None
+
 class CartItemCreate(BaseModel):
-    item_id: str
-    quantity: int 
\ No newline at end of file
+    item_id: UUID
+    quantity: int 
+
+# Текущий пользователь, извлечённый из токена доступа
+class Principal(BaseModel):
+    id: str
+    role: str